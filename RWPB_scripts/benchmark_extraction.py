@@ -0,0 +1,65 @@
+# benchmark of the extraction engine against process_answer and filter_unit_test
+import argparse
+import copy
+import glob
+import json
+import time
+
+from evaluate import process_answer
+from extract_function_body import filter_unit_test
+from extraction import extract_batch
+
+
+def legacy_batch(datas):
+    """
+        process_answer on every solution, then filter_unit_test on the file
+    """
+    for item in datas:
+        item['solution'] = process_answer(item['solution'])
+    filter_unit_test(datas)
+    return datas
+
+
+def best_time(function, datas, repeat):
+    """
+        the fastest of `repeat` runs on fresh copies of the file, and the output of the last one
+    """
+    best = None
+    for _ in range(repeat):
+        copied = copy.deepcopy(datas)
+        start = time.perf_counter()
+        output = function(copied)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the extraction engine on the model files")
+    parser.add_argument('--files', nargs='*', default=['./LLMGeneratedCode/*.json'],
+                        help="json files of LLM's output, glob patterns are expanded")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    file_names = []
+    for pattern in args.files:
+        file_names.extend(sorted(glob.glob(pattern)))
+
+    print(f"{'file':<24} {'solutions':>9} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8} {'mismatches':>10}")
+    total_legacy = total_engine = 0.0
+    for file_name in file_names:
+        with open(file_name, 'r') as f:
+            datas = json.load(f)
+        legacy, expected = best_time(legacy_batch, datas, args.repeat)
+        engine, extracted = best_time(extract_batch, datas, args.repeat)
+        mismatches = sum(a['solution'] != b['solution'] for a, b in zip(expected, extracted))
+        total_legacy += legacy
+        total_engine += engine
+        print(f"{file_name.split('/')[-1]:<24} {len(datas):>9} {legacy * 1000:>10.2f} {engine * 1000:>10.2f} "
+              f"{legacy / engine:>8.1f} {mismatches:>10}")
+    print(f"{'total':<24} {'':>9} {total_legacy * 1000:>10.2f} {total_engine * 1000:>10.2f} "
+          f"{total_legacy / total_engine:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# runtime and memory of the generated solutions against the canonical ones, on the inputs of the unit tests
+# scaled up along their first dimension
+import argparse
+import csv
+import json
+import math
+
+from evaluate import build_test_script, find_function_names, model_name, executors, task_libraries
+from loader import iter_records
+from sandbox import ForkServer
+from compare import prelude
+
+MARKER = '__rwpb_benchmark__ '  # the summary line the driver writes to stderr
+
+# runs in the sandbox after the solution and the canonical solution. TESTS, FUNCTION, SCALE, WARMUP,
+# REPEAT, MIN_TIME, BUDGET and the comparison __rwpb_close__ of compare.py are prepended
+DRIVER = r'''
+import copy as __copy
+import json as __json
+import os as __os
+import resource as __resource
+import signal as __signal
+import sys as __sys
+import time as __time
+
+__rwpb_calls__ = []
+__rwpb_depth__ = [0]
+__rwpb_canonical__ = SOLUTION_SIGNATURE
+
+
+def __rwpb_recorder__(*args, **kwargs):
+    if not __rwpb_depth__[0]:  # the calls of the tests, not the recursive ones
+        __rwpb_calls__.append(__copy.deepcopy((args, kwargs)))
+    __rwpb_depth__[0] += 1
+    try:
+        return __rwpb_canonical__(*args, **kwargs)
+    finally:
+        __rwpb_depth__[0] -= 1
+
+
+def __rwpb_scale__(value, factor):
+    torch = __sys.modules.get('torch')
+    numpy = __sys.modules.get('numpy')
+    if torch is not None and isinstance(value, torch.Tensor) and value.dim() > 0:
+        return torch.cat([value] * factor)
+    if numpy is not None and isinstance(value, numpy.ndarray) and value.ndim > 0:
+        return numpy.concatenate([value] * factor)
+    if isinstance(value, list):
+        return value * factor
+    return value
+
+
+def __rwpb_scaled__(args, kwargs, factor):
+    """the call scaled by factor when both functions still agree on it, else as it is"""
+    if factor > 1:
+        scaled = ([__rwpb_scale__(value, factor) for value in args],
+                  {key: __rwpb_scale__(value, factor) for key, value in kwargs.items()})
+        try:
+            if __rwpb_close__(__rwpb_generated__(*scaled[0], **scaled[1]),
+                              __rwpb_canonical__(*scaled[0], **scaled[1])):
+                return scaled, factor
+        except Exception:
+            pass
+    return (args, kwargs), 1
+
+
+def __rwpb_peak__(function, args, kwargs, limit):
+    """the growth of the resident set in bytes during one call, None if it failed or took over limit seconds"""
+    # the call runs in a forked child, whose high-water mark starts at the current RSS,
+    # so the native allocations of numpy and torch count as well, unlike with tracemalloc
+    read_fd, write_fd = __os.pipe()
+    pid = __os.fork()
+    if pid == 0:
+        __os.close(read_fd)
+        peak = -1
+        try:
+            before = __resource.getrusage(__resource.RUSAGE_SELF).ru_maxrss
+            function(*args, **kwargs)
+            peak = __resource.getrusage(__resource.RUSAGE_SELF).ru_maxrss - before
+        finally:
+            __os.write(write_fd, str(peak).encode())
+            __os._exit(0)
+    __os.close(write_fd)
+    deadline = __time.monotonic() + limit
+    while not __os.waitpid(pid, __os.WNOHANG)[0]:
+        if __time.monotonic() > deadline:  # e.g. stuck in a thread pool that did not survive the fork
+            __os.kill(pid, __signal.SIGKILL)
+            __os.waitpid(pid, 0)
+            break
+        __time.sleep(0.001)
+    data = __os.read(read_fd, 64)
+    __os.close(read_fd)
+    if not data or int(data) < 0:
+        return None
+    return int(data) * (1 if __sys.platform == 'darwin' else 1024)  # ru_maxrss is in kilobytes on Linux
+
+
+def __rwpb_time__(function, args, kwargs):
+    """median and interquartile range of one call in seconds, and the peak RSS growth in bytes"""
+    for _ in range(WARMUP):
+        function(*args, **kwargs)
+    number = 1
+    while True:  # calls per sample, so that a sample takes at least MIN_TIME
+        start = __time.perf_counter()
+        for _ in range(number):
+            function(*args, **kwargs)
+        elapsed = __time.perf_counter() - start
+        if elapsed >= MIN_TIME or number >= 1 << 20:
+            break
+        number *= 2
+    samples = [elapsed / number]
+    for _ in range(REPEAT - 1):
+        start = __time.perf_counter()
+        for _ in range(number):
+            function(*args, **kwargs)
+        samples.append((__time.perf_counter() - start) / number)
+    samples.sort()
+    quartile = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    peak = __rwpb_peak__(function, args, kwargs, 1.0 + 10 * quartile(0.5))
+    return {'median': quartile(0.5), 'iqr': quartile(0.75) - quartile(0.25), 'peak': peak}
+
+
+def __rwpb_benchmark__():
+    global SOLUTION_SIGNATURE, __rwpb_generated__
+    summary = {'passed': True, 'calls': []}
+    SOLUTION_SIGNATURE = __rwpb_recorder__
+    try:
+        exec(TESTS, globals())
+    except BaseException as e:  # a failing solution is not benchmarked
+        summary['passed'] = False
+        summary['error'] = f"{type(e).__name__}: {e}"[:300]
+    SOLUTION_SIGNATURE = __rwpb_canonical__
+    __rwpb_generated__ = globals().get(FUNCTION)
+    deadline = __time.monotonic() + BUDGET
+    for args, kwargs in __rwpb_calls__ if summary['passed'] else []:
+        if __time.monotonic() > deadline:
+            break
+        (args, kwargs), factor = __rwpb_scaled__(args, kwargs, SCALE)
+        try:
+            canonical = __rwpb_time__(__rwpb_canonical__, args, kwargs)
+            generated = __rwpb_time__(__rwpb_generated__, args, kwargs)
+        except Exception:
+            continue
+        summary['calls'].append({'scale': factor, 'canonical': canonical, 'generated': generated})
+    __sys.stderr.write(MARKER + __json.dumps(summary) + '\n')
+
+
+__rwpb_benchmark__()
+'''
+
+
+def benchmark_script(item, scale=16, warmup=3, repeat=7, min_time=0.005, budget=20.0):
+    """
+        the script running the unit tests once to record the calls of the canonical function,
+        and then timing both functions on every recorded call
+    """
+    function = find_function_names(item['prompt'])[0]
+    code, lines = build_test_script(item)
+    tests = '\n'.join(lines)
+    settings = (f"TESTS = {tests!r}\nFUNCTION = {function!r}\nSCALE = {scale}\nWARMUP = {warmup}\n"
+                f"REPEAT = {repeat}\nMIN_TIME = {min_time}\nBUDGET = {budget}\nMARKER = {MARKER!r}\n"
+                f"{prelude()}\n")
+    return code + '\n' + settings + DRIVER
+
+
+def benchmark_record(stderr):
+    """
+        the timings of a benchmark run from its stderr. the medians and interquartile ranges of the calls
+        are summed to the time of one pass over the calls, the peak is the largest RSS growth of a call.
+        the slowdown of a task is the geometric mean over its calls of the generated median time divided
+        by the canonical one
+    """
+    record = {'verdict': 'fail', 'calls': 0, 'scale': None, 'canonical_median_total': None,
+              'generated_median_total': None, 'canonical_iqr_total': None, 'generated_iqr_total': None,
+              'canonical_peak_rss': None, 'generated_peak_rss': None, 'slowdown': None, 'error': None}
+    if stderr == "timeout error":
+        record['verdict'] = 'timeout'
+        return record
+    summary = None
+    for line in stderr.split('\n'):
+        if line.startswith(MARKER):
+            summary = json.loads(line[len(MARKER):])
+    if summary is None or not summary['passed']:
+        record['error'] = summary.get('error') if summary else stderr.strip()[-300:]
+        return record
+    calls = summary['calls']
+    record['calls'] = len(calls)
+    if not calls:
+        record['verdict'] = 'skipped'
+        return record
+    record['verdict'] = 'measured'
+    record['scale'] = min(call['scale'] for call in calls)
+    for side in ('canonical', 'generated'):
+        record[f'{side}_median_total'] = sum(call[side]['median'] for call in calls)
+        record[f'{side}_iqr_total'] = sum(call[side]['iqr'] for call in calls)
+        peaks = [call[side]['peak'] for call in calls if call[side]['peak'] is not None]
+        record[f'{side}_peak_rss'] = max(peaks) if peaks else None
+    ratios = [call['generated']['median'] / call['canonical']['median'] for call in calls
+              if call['canonical']['median'] > 0 and call['generated']['median'] > 0]
+    if ratios:
+        record['slowdown'] = math.exp(sum(math.log(ratio) for ratio in ratios) / len(ratios))
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the generated solutions against the canonical ones")
+    parser.add_argument('--files', nargs='*', default=['./LLMGeneratedCode/rwpb-llama3.json'],
+                        help="json files of LLM's output")
+    parser.add_argument('--scale', type=int, default=16,
+                        help="repeat the tensors, arrays and lists of the test inputs along their first dimension")
+    parser.add_argument('--warmup', type=int, default=3, help="untimed calls before the timing")
+    parser.add_argument('--repeat', type=int, default=7, help="timed samples per call")
+    parser.add_argument('--min-time', type=float, default=0.005, help="the shortest sample in seconds")
+    parser.add_argument('--budget', type=float, default=20, help="seconds of timing per task")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds per task")
+    parser.add_argument('--executor', choices=['subprocess', 'pipe', 'forkserver'], default='subprocess')
+    parser.add_argument('--slowdown', type=float, default=10, help="list the tasks at least this much slower")
+    parser.add_argument('--output', default=None, help="csv file receiving one row per model and task")
+    args = parser.parse_args()
+
+    servers = {}
+    rows = []
+    try:
+        for file_name in args.files:
+            model = model_name(file_name)
+            for item in iter_records(file_name):
+                server = None
+                if args.executor == 'forkserver':
+                    group = task_libraries(item)
+                    if group not in servers:
+                        servers[group] = ForkServer(preload=group)
+                        servers[group].start()
+                    server = servers[group]
+                execute = executors(args.executor, server)[0]
+                script = benchmark_script(item, args.scale, args.warmup, args.repeat, args.min_time, args.budget)
+                record = benchmark_record(execute(script, timeout=args.timeout))
+                rows.append(dict(record, model=model, task_id=item['task_id']))
+    finally:
+        for server in servers.values():
+            server.close()
+
+    print(f"{'model':<12} {'measured':>8} {'slowdown':>9} {'>= ' + str(args.slowdown) + 'x':>8}")
+    for model in dict.fromkeys(row['model'] for row in rows):
+        slowdowns = [row['slowdown'] for row in rows if row['model'] == model and row['slowdown']]
+        mean = math.exp(sum(map(math.log, slowdowns)) / len(slowdowns)) if slowdowns else float('nan')
+        slow = sum(slowdown >= args.slowdown for slowdown in slowdowns)
+        print(f"{model:<12} {len(slowdowns):>8} {mean:>9.2f} {slow:>8}")
+    for row in sorted(rows, key=lambda row: -(row['slowdown'] or 0)):
+        if row['slowdown'] and row['slowdown'] >= args.slowdown:
+            print(f"{row['model']} {row['task_id']}: {row['slowdown']:.1f}x slower "
+                  f"({row['generated_median_total'] * 1e3:.3f} ms vs {row['canonical_median_total'] * 1e3:.3f} ms "
+                  f"over {row['calls']} calls)")
+    if args.output:
+        fields = ['model', 'task_id', 'verdict', 'calls', 'scale', 'canonical_median_total', 'generated_median_total',
+                  'canonical_iqr_total', 'generated_iqr_total', 'canonical_peak_rss', 'generated_peak_rss',
+                  'slowdown', 'error']
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# throughput of the parallel sweep against the number of workers
+import argparse
+import glob
+import itertools
+import os
+import tempfile
+import time
+
+from loader import iter_records, write_records
+from scheduler import schedule
+from sandbox import available_cores, threads_per_worker
+
+
+def worker_counts(cores):
+    """
+        1, 2, 4, ... up to the number of cores, which is always included
+    """
+    counts = []
+    workers = 1
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    counts.append(cores)
+    return counts
+
+
+def truncate_files(file_names, tasks, directory):
+    """
+        copies of the model files holding only their first `tasks` tasks
+    """
+    truncated = []
+    for file_name in file_names:
+        path = os.path.join(directory, os.path.basename(file_name))
+        write_records(path, itertools.islice(iter_records(file_name), tasks))
+        truncated.append(path)
+    return truncated
+
+
+def measure(file_names, workers, cores, executor, preload, mode):
+    """
+        the wall time of one sweep and its number of jobs
+    """
+    start = time.monotonic()
+    rows = schedule(file_names, workers, executor, preload, cores=cores, mode=mode)
+    return time.monotonic() - start, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the sweep throughput against the number of workers")
+    parser.add_argument('--files', nargs='*', default=['./LLMGeneratedCode/*.json'],
+                        help="json files of LLM's output, glob patterns are expanded")
+    parser.add_argument('--tasks', type=int, default=None, help="only evaluate the first tasks of every file")
+    parser.add_argument('--workers', type=int, nargs='*', default=None,
+                        help="the worker counts to measure, powers of two up to the core budget by default")
+    parser.add_argument('--cores', type=int, default=available_cores(), help="core budget split over the workers")
+    parser.add_argument('--uncapped', action='store_true',
+                        help="also measure every worker count with the thread pools at the library defaults")
+    parser.add_argument('--executor', choices=['subprocess', 'pipe', 'forkserver'], default='subprocess')
+    parser.add_argument('--preload', nargs='*', default=['torch', 'numpy'])
+    parser.add_argument('--mode', choices=['cumulative', 'incremental', 'batch'], default='cumulative')
+    args = parser.parse_args()
+
+    file_names = []
+    for pattern in args.files:
+        file_names.extend(sorted(glob.glob(pattern)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.tasks:
+            file_names = truncate_files(file_names, args.tasks, directory)
+
+        print(f"{'workers':>7} {'threads':>7} {'seconds':>9} {'jobs/s':>8} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers or worker_counts(args.cores):
+            budgets = [args.cores, 0] if args.uncapped else [args.cores]
+            for cores in budgets:
+                seconds, jobs = measure(file_names, workers, cores, args.executor, args.preload, args.mode)
+                if baseline is None:
+                    baseline = seconds
+                threads = threads_per_worker(workers, cores) if cores else 'default'
+                print(f"{workers:>7} {threads:>7} {seconds:>9.1f} {jobs / seconds:>8.2f} {baseline / seconds:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# comparison of results at a tolerance. it runs inside the sandbox, next to the results it compares,
+# so large tensors are compared where they were computed and are never pickled or copied out
+import math
+import sys
+
+RTOL = 1e-5
+ATOL = 1e-8
+
+
+def close(actual, expected, rtol=RTOL, atol=ATOL, broadcast=False):
+    """
+        actual equals expected up to the tolerance: torch tensors and numpy arrays elementwise,
+        PIL images by their pixels, lists, tuples and dicts of the same type element by element,
+        floats with math.isclose and everything else with ==. values without a float, array or
+        tensor inside are compared with == alone, so only the tolerance differs from ==.
+        with broadcast, tensors and arrays of different shapes are compared like == compares them
+    """
+    torch = sys.modules.get('torch')
+    numpy = sys.modules.get('numpy')
+    if torch is not None and (isinstance(actual, torch.Tensor) or isinstance(expected, torch.Tensor)):
+        return _close_tensors(torch, actual, expected, rtol, atol, broadcast)
+    if numpy is not None and (isinstance(actual, numpy.ndarray) or isinstance(expected, numpy.ndarray)):
+        return _close_arrays(numpy, actual, expected, rtol, atol, broadcast)
+    if not (_is_inexact(actual) or _is_inexact(expected)):
+        return _equal(actual, expected)
+    if _is_image(actual) and _is_image(expected):
+        return (actual.mode == expected.mode and actual.size == expected.size
+                and (actual.tobytes() == expected.tobytes()
+                     or numpy is not None and close(numpy.asarray(actual), numpy.asarray(expected), rtol, atol)))
+    if isinstance(actual, (list, tuple, dict)) and type(actual) is not type(expected):
+        return _equal(actual, expected)
+    if isinstance(actual, dict):
+        return actual.keys() == expected.keys() and all(close(actual[key], expected[key], rtol, atol, broadcast)
+                                                        for key in actual)
+    if isinstance(actual, (list, tuple)):
+        return len(actual) == len(expected) and all(close(a, e, rtol, atol, broadcast)
+                                                    for a, e in zip(actual, expected))
+    if _is_number(actual) and _is_number(expected):
+        if math.isnan(actual) and math.isnan(expected):
+            return True
+        return math.isclose(actual, expected, rel_tol=rtol, abs_tol=atol)
+    return _equal(actual, expected)
+
+
+def close_all(actual, expected, rtol=RTOL, atol=ATOL, broadcast=False):
+    """
+        (actual == expected).all() at the tolerance. without a tensor or array on either side
+        the expression is evaluated as it is, raising where the original assert raised
+    """
+    if not (_is_array(actual) or _is_array(expected)):
+        return bool((actual == expected).all())
+    return close(actual, expected, rtol, atol, broadcast)
+
+
+def _equal(actual, expected):
+    try:
+        return bool(actual == expected)
+    except Exception:
+        return False
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_array(value):
+    torch = sys.modules.get('torch')
+    numpy = sys.modules.get('numpy')
+    return (torch is not None and isinstance(value, torch.Tensor)
+            or numpy is not None and isinstance(value, numpy.ndarray))
+
+
+def _is_inexact(value):
+    """
+        value is or holds a float, an array, a tensor or an image, the leaves compared at the tolerance
+    """
+    if isinstance(value, float) or _is_array(value) or _is_image(value):
+        return True
+    if isinstance(value, dict):
+        return any(_is_inexact(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_is_inexact(item) for item in value)
+    return False
+
+
+def _is_image(value):
+    return type(value).__module__.startswith('PIL.') and hasattr(value, 'tobytes') and hasattr(value, 'mode')
+
+
+def _close_tensors(torch, actual, expected, rtol, atol, broadcast):
+    """
+        elementwise comparison in one vectorized call, the tensors are only converted when their dtype
+        or device differ
+    """
+    try:
+        if not isinstance(actual, torch.Tensor):
+            actual = torch.as_tensor(actual, device=expected.device)
+        if not isinstance(expected, torch.Tensor):
+            expected = torch.as_tensor(expected, device=actual.device)
+    except Exception:
+        return False
+    if not broadcast and actual.shape != expected.shape:
+        return False
+    actual, expected = actual.detach(), expected.detach().to(actual.device)
+    dtype = torch.promote_types(actual.dtype, expected.dtype)
+    try:
+        if dtype.is_floating_point or dtype.is_complex:
+            return bool(torch.isclose(actual.to(dtype), expected.to(dtype), rtol=rtol, atol=atol,
+                                      equal_nan=True).all())
+        return bool((actual == expected).all())
+    except RuntimeError:  # shapes that do not broadcast
+        return False
+
+
+def _close_arrays(numpy, actual, expected, rtol, atol, broadcast):
+    actual, expected = numpy.asarray(actual), numpy.asarray(expected)
+    if not broadcast and actual.shape != expected.shape:
+        return False
+    try:
+        if actual.dtype.kind in 'fc' or expected.dtype.kind in 'fc':
+            return bool(numpy.isclose(actual, expected, rtol=rtol, atol=atol, equal_nan=True).all())
+        return bool(numpy.all(actual == expected))
+    except (TypeError, ValueError):
+        return False
+
+
+def prelude(rtol=RTOL, atol=ATOL, broadcast=False):
+    """
+        one line of code defining __rwpb_close__(actual, expected) and __rwpb_close_all__(actual, expected)
+        in the sandbox with this module's close and close_all
+    """
+    with open(__file__, 'r', encoding='utf-8') as f:
+        source = f.read()
+    return (f"__rwpb_compare__ = {{'__name__': 'compare'}}; exec({source!r}, __rwpb_compare__); "
+            f"__rwpb_close__ = lambda actual, expected: "
+            f"__rwpb_compare__['close'](actual, expected, {rtol!r}, {atol!r}, {broadcast!r}); "
+            f"__rwpb_close_all__ = lambda actual, expected: "
+            f"__rwpb_compare__['close_all'](actual, expected, {rtol!r}, {atol!r}, {broadcast!r})")
+
+
+def tolerant_assert(line):
+    """
+        an assert line comparing with == rewritten to compare with __rwpb_close__, and one comparing with
+        (... == ...).all() with __rwpb_close_all__. other lines are returned as they are
+    """
+    import ast
+
+    try:
+        tree = ast.parse(line.strip())
+    except SyntaxError:
+        return line
+    if len(tree.body) != 1 or not isinstance(tree.body[0], ast.Assert):
+        return line
+    statement = tree.body[0]
+    test = statement.test
+    function = '__rwpb_close__'
+    if (isinstance(test, ast.Call) and not test.args and not test.keywords
+            and isinstance(test.func, ast.Attribute) and test.func.attr == 'all'):
+        test = test.func.value
+        function = '__rwpb_close_all__'
+    if not (isinstance(test, ast.Compare) and len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq)):
+        return line
+    statement.test = ast.Call(func=ast.Name(function, ast.Load()),
+                              args=[test.left, test.comparators[0]], keywords=[])
+    return ast.unparse(statement)
+
+
+def tolerant_tests(tests, rtol=RTOL, atol=ATOL):
+    """
+        the unit tests with every == assert comparing at the tolerance, see tolerant_assert.
+        the comparisons broadcast like == does, so only the tolerance is added
+    """
+    lines = [tolerant_assert(line) if line.startswith('assert') else line for line in tests.split('\n')]
+    return prelude(rtol, atol, broadcast=True) + '\n' + '\n'.join(lines)
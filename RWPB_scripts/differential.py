@@ -0,0 +1,294 @@
+# differential testing: the generated and the canonical function are called on many random inputs
+# derived from the type and shape hints of the prompt, and their outputs are compared at a tolerance
+import argparse
+import ast
+import csv
+import json
+import re
+import time
+
+from evaluate import build_test_script, find_function_names, model_name, executors, task_libraries
+from loader import iter_records
+from sandbox import ForkServer
+from compare import prelude
+
+MARKER = '__rwpb_differential__ '  # the summary line the driver writes to stderr
+SHAPE = re.compile(r"shape\s*(?:of\s*|is\s*|=\s*)?[\[(]([^\])]+)[\])]")
+DIMS = re.compile(r"[\[(]\s*(\w+(?:\s*,\s*\w+)+)\s*,?\s*[\])]")
+DEFAULT_SHAPE = ['_rows', '_cols']  # tensors without a shape hint get the same random 2-d shape
+
+# runs in the sandbox after the solution and the canonical solution, SPECS, FUNCTION, INPUTS,
+# SEED, BUDGET and the comparison __rwpb_close__ of compare.py are prepended
+DRIVER = r'''
+import copy as __copy
+import json as __json
+import random as __random
+import sys as __sys
+import time as __time
+
+
+def __rwpb_seed__(seed):
+    __random.seed(seed)
+    if 'numpy' in __sys.modules:
+        __sys.modules['numpy'].random.seed(seed)
+    if 'torch' in __sys.modules:
+        __sys.modules['torch'].manual_seed(seed)
+
+
+def __rwpb_value__(spec, sizes):
+    shape = []
+    for dim in spec.get('shape') or []:
+        if isinstance(dim, str):
+            dim = sizes.setdefault(dim, __random.randint(1, 4))
+        shape.append(dim)
+    kind = spec['kind']
+    if kind == 'int':
+        return __random.randint(1, 8)
+    if kind == 'float':
+        return __random.random()
+    if kind == 'bool':
+        return __random.random() < 0.5
+    if kind == 'str':
+        return ''.join(__random.choice('abcXYZ019_-./: ') for _ in range(__random.randint(0, 12)))
+    if kind == 'list':
+        length = shape[0] if shape else __random.randint(1, 8)
+        if spec['dtype'] == 'int':
+            return [__random.randint(0, 9) for _ in range(length)]
+        return [__random.uniform(-1, 1) for _ in range(length)]
+    if kind == 'tensor':
+        import torch
+        if spec['dtype'] == 'int':
+            return torch.randint(0, 10, shape)
+        return torch.randn(shape)
+    import numpy
+    if spec['dtype'] == 'int':
+        return numpy.random.randint(0, 10, shape)
+    return numpy.random.randn(*shape)
+
+
+def __rwpb_differential__():
+    summary = {'inputs': 0, 'valid': 0, 'mismatches': 0, 'errors': 0, 'first': None}
+    generated = globals()[FUNCTION]
+    deadline = __time.monotonic() + BUDGET
+    for index in range(INPUTS):
+        if __time.monotonic() > deadline:
+            break
+        summary['inputs'] += 1
+        __rwpb_seed__(SEED + index)
+        sizes = {}
+        try:
+            args = [__rwpb_value__(spec, sizes) for spec in SPECS]
+        except Exception:
+            continue
+        __rwpb_seed__(SEED + index)
+        try:
+            expected = SOLUTION_SIGNATURE(*__copy.deepcopy(args))
+        except Exception:
+            continue  # not a valid input for the task
+        summary['valid'] += 1
+        __rwpb_seed__(SEED + index)
+        try:
+            actual = generated(*__copy.deepcopy(args))
+        except Exception as e:
+            summary['errors'] += 1
+            if summary['first'] is None:
+                summary['first'] = f"input {index}: {type(e).__name__}: {e}"[:300]
+            continue
+        if not __rwpb_close__(actual, expected):
+            summary['mismatches'] += 1
+            if summary['first'] is None:
+                summary['first'] = f"input {index}: {repr(actual)[:120]} != {repr(expected)[:120]}"
+    __sys.stderr.write(MARKER + __json.dumps(summary) + '\n')
+
+
+__rwpb_differential__()
+'''
+
+
+def signature(prompt):
+    """
+        the function of the prompt, its parameters and how many of them have no default
+    """
+    name = find_function_names(prompt)[0]
+    for node in ast.walk(ast.parse(prompt)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+            params = node.args.posonlyargs + node.args.args
+            return node, params, len(params) - len(node.args.defaults)
+    raise ValueError(f"no function {name} in the prompt")
+
+
+def docstring_entry(doc, name):
+    """
+        the text documenting a parameter: its line in the Args or Parameters section
+        and the more indented lines that follow it
+    """
+    lines = doc.split('\n')
+    pattern = re.compile(r"^(\s*)(?:\w+\s*,\s*)*" + re.escape(name) + r"(?:\s*,\s*\w+)*\s*(\([^)]*\))?\s*:")
+    for index, line in enumerate(lines):
+        match = pattern.match(line)
+        if match:
+            indent = len(match.group(1))
+            entry = [line[match.end(1):]]
+            for follow in lines[index + 1:]:
+                if not follow.strip() or len(follow) - len(follow.lstrip()) <= indent:
+                    break
+                entry.append(follow.strip())
+            return ' '.join(entry)
+    return ''
+
+
+def parse_shape(hint):
+    """
+        the dimensions in a hint like 'of shape [batch_size, num_points, 3]' or '(B,6)',
+        numbers as int and names as str, None without one
+    """
+    match = SHAPE.search(hint) or DIMS.search(hint)
+    if not match:
+        return None
+    shape = []
+    for dim in match.group(1).split(','):
+        dim = dim.strip()
+        if dim.isdigit():
+            shape.append(int(dim))
+        elif re.fullmatch(r'\w+', dim):
+            shape.append(dim)
+        elif dim:
+            return None  # an expression or an ellipsis
+    return shape or None
+
+
+def input_spec(hint):
+    """
+        how to generate a value for a parameter with the given hint, None when it is not supported
+    """
+    text = hint.lower()
+    dtype = 'int' if re.search(r'\b(?:int|long|index|indices|label|labels)\b', text) else 'float'
+    if 'tensor' in text:
+        return {'kind': 'tensor', 'dtype': dtype, 'shape': parse_shape(hint) or DEFAULT_SHAPE}
+    if 'ndarray' in text or 'np.array' in text or 'array' in text:
+        return {'kind': 'array', 'dtype': dtype, 'shape': parse_shape(hint) or DEFAULT_SHAPE}
+    if re.search(r'\b(?:list|sequence)\b', text):
+        return {'kind': 'list', 'dtype': dtype, 'shape': parse_shape(hint)}
+    if re.search(r'\bbool\b', text):
+        return {'kind': 'bool'}
+    if re.search(r'\b(?:str|string)\b', text):
+        return {'kind': 'str'}
+    if re.search(r'\bfloat\b', text):
+        return {'kind': 'float'}
+    if re.search(r'\bint\b', text):
+        return {'kind': 'int'}
+    return None
+
+
+def task_specs(item):
+    """
+        the input specs of the parameters without a default, the others keep their defaults.
+        None when a parameter has no usable hint
+    """
+    function, params, required = signature(item['prompt'])
+    doc = ast.get_docstring(function) or ''
+    specs = []
+    for param in params[:required]:
+        hint = docstring_entry(doc, param.arg)
+        if param.annotation is not None:
+            hint = ast.unparse(param.annotation) + ' ' + hint
+        spec = input_spec(hint)
+        if spec is None:
+            return None
+        specs.append(spec)
+    return specs
+
+
+def differential_script(item, inputs=1000, seed=0, budget=10.0, rtol=1e-5, atol=1e-8):
+    """
+        the script running the generated and the canonical function on the random inputs,
+        None when the inputs of the task cannot be generated
+    """
+    specs = task_specs(item)
+    if specs is None:
+        return None
+    function = find_function_names(item['prompt'])[0]
+    code, _ = build_test_script(item)
+    settings = (f"SPECS = {specs!r}\nFUNCTION = {function!r}\nINPUTS = {inputs}\nSEED = {seed}\n"
+                f"BUDGET = {budget}\nMARKER = {MARKER!r}\n{prelude(rtol, atol)}\n")
+    return code + '\n' + settings + DRIVER
+
+
+def differential_record(stderr):
+    """
+        the verdict and counts of a differential run from its stderr: pass when every valid input
+        gives the same output, skipped when no input was valid for the canonical solution
+    """
+    record = {'verdict': 'fail', 'inputs': 0, 'valid': 0, 'mismatches': 0, 'errors': 0, 'first': None}
+    if stderr == "timeout error":
+        record['verdict'] = 'timeout'
+        return record
+    summary = None
+    for line in stderr.split('\n'):
+        if line.startswith(MARKER):
+            summary = json.loads(line[len(MARKER):])
+    if summary is None:  # the script did not get to the inputs
+        record['first'] = stderr.strip()[-300:]
+        return record
+    record.update(summary)
+    if not summary['valid']:
+        record['verdict'] = 'skipped'
+    elif not summary['mismatches'] and not summary['errors']:
+        record['verdict'] = 'pass'
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the generated and canonical functions on random inputs")
+    parser.add_argument('--file', default='./LLMGeneratedCode/rwpb-llama3.json', help="json file of LLM's output")
+    parser.add_argument('--inputs', type=int, default=1000, help="random inputs per task")
+    parser.add_argument('--budget', type=float, default=10, help="seconds of inputs per task")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rtol', type=float, default=1e-5)
+    parser.add_argument('--atol', type=float, default=1e-8)
+    parser.add_argument('--timeout', type=float, default=60, help="seconds per task")
+    parser.add_argument('--executor', choices=['subprocess', 'pipe', 'forkserver'], default='subprocess')
+    parser.add_argument('--output', default=None, help="csv file receiving one row per task")
+    args = parser.parse_args()
+
+    model = model_name(args.file)
+    servers = {}
+    rows = []
+    try:
+        for item in iter_records(args.file):
+            server = None
+            if args.executor == 'forkserver':
+                group = task_libraries(item)
+                if group not in servers:
+                    servers[group] = ForkServer(preload=group)
+                    servers[group].start()
+                server = servers[group]
+            execute = executors(args.executor, server)[0]
+
+            start = time.monotonic()
+            script = differential_script(item, args.inputs, args.seed, args.budget, args.rtol, args.atol)
+            if script is None:
+                record = differential_record("")
+                record.update(verdict='skipped', first="no input hints for the parameters")
+            else:
+                record = differential_record(execute(script, timeout=args.timeout))
+            rows.append(dict(record, model=model, task_id=item['task_id'], duration=round(time.monotonic() - start, 3)))
+            print(f"{item['task_id']}: {record['verdict']}, {record['valid']} valid inputs, "
+                  f"{record['mismatches']} mismatches, {record['errors']} errors")
+    finally:
+        for server in servers.values():
+            server.close()
+
+    tested = [row for row in rows if row['verdict'] != 'skipped']
+    passed = sum(row['verdict'] == 'pass' for row in tested)
+    print(f"{model}: {len(rows)} tasks, {len(tested)} tested, pass rate: {passed / len(tested) if tested else None}")
+    if args.output:
+        fields = ['model', 'task_id', 'verdict', 'inputs', 'valid', 'mismatches', 'errors', 'first', 'duration']
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# fingerprint of the interpreter and of the libraries the benchmark imports, read from the package
+# metadata without importing them, so that verdicts computed on different machines can be compared.
+# the sandboxes run under the same interpreter, sandbox.PYTHON, so it describes where the code ran
+import argparse
+import glob
+import hashlib
+import json
+import os
+import platform
+import sys
+from importlib import metadata
+
+from import_scan import imported_modules
+
+RAW_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RWPB', 'raw_data')
+
+# the distributions installing a top level module, by module name. the first one installed is used
+DISTRIBUTIONS = {
+    'torch': ['torch'],
+    'numpy': ['numpy'],
+    'scipy': ['scipy'],
+    'cv2': ['opencv-python', 'opencv-python-headless', 'opencv-contrib-python', 'opencv-contrib-python-headless'],
+    'PIL': ['pillow'],
+    'pandas': ['pandas'],
+    'sklearn': ['scikit-learn'],
+    'einops': ['einops'],
+    'roma': ['roma'],
+    'torchtyping': ['torchtyping'],
+    'matplotlib': ['matplotlib'],
+}
+
+_fingerprints = {}
+
+
+def benchmark_modules(directory=RAW_DATA):
+    """
+        the third party modules imported across the tasks of the benchmark, the known ones
+        when the raw data is not there
+    """
+    files = glob.glob(os.path.join(directory, '*.py'))
+    if not files:
+        return sorted(DISTRIBUTIONS)
+    modules = set()
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            modules |= imported_modules(f.read())
+    return sorted(name for name in modules if name not in sys.stdlib_module_names)
+
+
+def module_version(module, installed=None):
+    """
+        the version of the distribution installing the module, None when it is not installed
+    """
+    names = DISTRIBUTIONS.get(module)
+    if names is None:
+        if installed is None:
+            installed = metadata.packages_distributions()
+        names = installed.get(module, [module])
+    for name in names:
+        try:
+            return f"{name}=={metadata.version(name)}"
+        except metadata.PackageNotFoundError:
+            continue
+    return None
+
+
+def environment(modules=None):
+    """
+        the interpreter and the versions of the modules, the modules of the benchmark by default.
+        the version of python leaves out the build, which differs between machines running the same release
+    """
+    if modules is None:
+        modules = benchmark_modules()
+    installed = None
+    if any(module not in DISTRIBUTIONS for module in modules):
+        installed = metadata.packages_distributions()
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'libraries': {module: module_version(module, installed) for module in modules}}
+
+
+def environment_fingerprint(modules=None):
+    """
+        hash of the environment, computed once per process for the same modules
+    """
+    key = tuple(modules) if modules is not None else None
+    if key not in _fingerprints:
+        snapshot = environment(modules)
+        _fingerprints[key] = hashlib.sha256(json.dumps(snapshot, sort_keys=True).encode()).hexdigest()[:16]
+    return _fingerprints[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="print the environment the verdicts depend on and its fingerprint")
+    parser.add_argument('--raw-data', default=RAW_DATA, help="directory of the benchmark tasks to scan for imports")
+    args = parser.parse_args()
+
+    snapshot = environment(benchmark_modules(args.raw_data))
+    print(f"{snapshot['implementation']} {snapshot['python']}")
+    for module, version in snapshot['libraries'].items():
+        print(f"{module}: {version or 'not installed'}")
+    print(f"fingerprint: {environment_fingerprint(list(snapshot['libraries']))}")
+
+
+if __name__ == '__main__':
+    main()
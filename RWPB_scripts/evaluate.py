@@ -1,3 +1,7 @@
+import argparse
+import asyncio
+import contextlib
+import functools
 import json
 import os
 import tempfile
@@ -6,6 +10,20 @@ import sys
 import io
 import traceback
 import subprocess
+import time
+
+from sandbox import run_code, run_code_pipe, run_session, run_batch, is_failure, error_class, timed, ForkServer, \
+    limit_threads, run_code_async, PHASES
+from result_cache import ResultCache
+from results_sink import open_sink, assert_rows, job_counts
+from run_dir import RunDirectory
+from import_scan import preload_group
+from extraction import compile_error
+from loader import iter_records
+from pass_at_k import unique_samples, mean_pass_at_k, SAMPLE_SEPARATOR
+from normalize import solution_fingerprint
+from compare import tolerant_tests, RTOL, ATOL
+from job_queue import JobQueue, job_name, run_workers
 
 def find_function_names(code):
     """
@@ -47,43 +65,20 @@ def process_answer(text):
         return text
 
 
-
-cnt = 0
-t_pass = 0
-t_partial_wrong = 0
-
-def run_code(code):
+def model_name(file_name):
     """
-        execute the extracted code
+        rwpb-gpt4.json -> gpt4
     """
-    with tempfile.NamedTemporaryFile(delete=False, mode='w') as temp_file:
-        temp_file.write(code)
-        temp_file_path = temp_file.name
-    if True:
-        try:
-            result = subprocess.run(["python", temp_file_path], capture_output=True, text=True, timeout=60)
-            errors = result.stderr
-            if "AssertionError" in errors:
-                errors = "function_error"
-        except subprocess.TimeoutExpired:
-            errors = "timeout error"
-
-        os.remove(temp_file_path)
-    
-    return errors
-
-
-
-
-
-file_name = './LLMGeneratedCode/rwpb-llama3.json'
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    if name.startswith('rwpb-'):
+        name = name[5:]
+    return name
 
-with open(file_name, 'r') as f:
-    datas = json.load(f)
-
-for item in datas:
-    cnt += 1
 
+def build_test_script(item):
+    """
+        the code executed before the unit tests, and the lines of the unit tests
+    """
     # model_generated_code
     solution = item['solution']
 
@@ -98,30 +93,689 @@ for item in datas:
 
     lines = item['unprocess_testcases'].split('\n')
     code = solution + '\n' + canonical_solution + '\n'
-    tmp_assert_num = 0
-    tmp_wrong_num = 0
+    return code, lines
+
+
+def tolerant_item(item, rtol, atol):
+    """
+        the task with its == asserts comparing tensors, arrays and floats at the tolerance
+    """
+    return dict(item, unprocess_testcases=tolerant_tests(item['unprocess_testcases'], rtol, atol))
+
+
+def assert_record(content, duration, usage=None):
+    """
+        the verdict of one assert from the stderr of its execution,
+        with the peak RSS, CPU time and phases of the execution when they were measured
+    """
+    if content == "timeout error":
+        verdict = 'timeout'
+    elif is_failure(content):
+        verdict = 'fail'
+    else:
+        verdict = 'pass'
+    usage = usage or {}
+    record = {'verdict': verdict, 'stderr': content, 'duration': duration,
+              'peak_rss': usage.get('peak_rss'), 'cpu_time': usage.get('cpu_time')}
+    if usage.get('phases'):
+        record['phases'] = usage['phases']
+    return record
+
+
+def count_wrong(records):
+    """
+        the number of asserts and failed asserts
+    """
+    return len(records), sum(record['verdict'] != 'pass' for record in records)
+
+
+def run_asserts(item, execute=run_code, timeout=None):
+    """
+        run the growing test script at every assert, one record per assert.
+        a prefix that does not compile fails without being executed.
+        after a timeout the longer prefixes cannot finish either, they are skipped
+    """
+    code, lines = build_test_script(item)
+    records = []
     for line in lines:
         code = code + line + '\n'
         if line.startswith('assert'):
-            tmp_assert_num += 1
-            content = run_code(code)
-            content = content.replace("\n", "")
-            content = content.replace("\b", "")
-            content = content.strip()
-            if content != "":
-                tmp_wrong_num += 1
-    
-    if tmp_wrong_num != tmp_assert_num and tmp_wrong_num != 0:
-        print(f"{item['task_id']}")
-        t_partial_wrong += 1
-    
-    if tmp_wrong_num == 0:
-        t_pass += 1
+            if records and records[-1]['verdict'] in ('timeout', 'skipped'):
+                records.append({'verdict': 'skipped', 'stderr': '', 'duration': 0.0})
+                continue
+            error = compile_error(code)
+            if error:
+                records.append(assert_record(error, 0.0))
+                continue
+            start = time.monotonic()
+            usage = {}
+            content = execute(code, usage=usage) if timeout is None else execute(code, timeout=timeout, usage=usage)
+            records.append(assert_record(content, time.monotonic() - start, usage))
+    return records
+
+
+async def run_asserts_async(item, execute=run_code_async, timeout=None, semaphore=None):
+    """
+        run_asserts as a coroutine, each prefix holding the semaphore while its sandbox runs.
+        the prefixes of a task run one after another, so after a timeout the longer prefixes
+        are skipped without starting them, and the concurrency comes from the tasks in flight
+    """
+    code, lines = build_test_script(item)
+    records = []
+    for line in lines:
+        code = code + line + '\n'
+        if line.startswith('assert'):
+            if records and records[-1]['verdict'] in ('timeout', 'skipped'):
+                records.append({'verdict': 'skipped', 'stderr': '', 'duration': 0.0})
+                continue
+            error = compile_error(code)
+            if error:
+                records.append(assert_record(error, 0.0))
+                continue
+            async with semaphore or contextlib.nullcontext():
+                start = time.monotonic()
+                content = await (execute(code) if timeout is None else execute(code, timeout=timeout))
+            records.append(assert_record(content, time.monotonic() - start))
+    return records
+
+
+async def evaluate_async(jobs, concurrency, execute=run_code_async, timeout=None):
+    """
+        yield (item, records, duration) for the (item, task_id) jobs in their order, with up to
+        `concurrency` sandboxes in flight. every task runs one sandbox at a time, the jobs are
+        taken lazily and twice `concurrency` tasks are held at once
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        start = time.monotonic()
+        records = await run_asserts_async(item, execute, timeout, semaphore)
+        return records, time.monotonic() - start
+
+    window = []  # the running jobs, oldest first
+    for item, task_id in jobs:
+        window.append((item, task_id, asyncio.ensure_future(run(item))))
+        while len(window) > 2 * concurrency or (window and window[0][2].done()):
+            item, task_id, future = window.pop(0)
+            records, duration = await future
+            yield item, task_id, records, duration
+    for item, task_id, future in window:
+        records, duration = await future
+        yield item, task_id, records, duration
+
+
+def evaluate_task(item, execute=run_code, timeout=None):
+    """
+        run the unit tests of one task, return the number of asserts and failed asserts
+    """
+    return count_wrong(run_asserts(item, execute, timeout))
+
+
+def split_prefixes(item):
+    """
+        cut the test script after every assert into segments of [source, line_offset].
+        returns the segments and, for every assert, the index of the segment ending with it
+        or the error of its prefix when that does not compile. None when a statement spans
+        two asserts, such a task has to re-run the prefixes
+    """
+    code, lines = build_test_script(item)
+    prefixes = []
+    for line in lines:
+        code = code + line + '\n'
+        if line.startswith('assert'):
+            prefixes.append(code)
+
+    segments = []
+    assert_segments = []  # the segment ending with each assert, or the error of a prefix that does not compile
+    done = 0
+    for prefix in prefixes:
+        error = compile_error(prefix)
+        if error:
+            assert_segments.append(error)
+            continue
+        offset = prefix.count('\n', 0, done)
+        source = prefix[done:]
+        if compile_error('\n' * offset + source):
+            return None
+        segments.append([source, offset])
+        assert_segments.append(len(segments) - 1)
+        done = len(prefix)
+    return segments, assert_segments
+
+
+def run_asserts_incremental(item, execute_session=run_session, execute=run_code, timeout=None):
+    """
+        run the solution and the setup once, then each assert in the same sandbox.
+        gives the same verdicts as run_asserts, which re-runs the growing script for every assert:
+        a prefix that does not compile fails only its own assert, any other stderr fails
+        the assert and every later one
+    """
+    split = split_prefixes(item)
+    if split is None:  # a statement spans two asserts, fall back to re-running the prefixes
+        return run_asserts(item, execute, timeout)
+    segments, assert_segments = split
+
+    results = []
+    if segments:
+        results = execute_session(segments) if timeout is None else execute_session(segments, timeout=timeout)
+
+    records = []
+    for index in assert_segments:
+        if isinstance(index, str):
+            records.append({'verdict': 'fail', 'stderr': index, 'duration': 0.0})
+            continue
+        # the session stops at the first failure, later asserts see its final state
+        reached = results[:index + 1]
+        result = results[index] if index < len(results) else {}
+        duration = result.get('duration', 0.0)
+        if any(result['timed_out'] for result in reached):
+            verdict = 'skipped' if records and records[-1]['verdict'] in ('timeout', 'skipped') else 'timeout'
+            records.append({'verdict': verdict, 'stderr': "timeout error" if verdict == 'timeout' else '',
+                            'duration': duration, 'peak_rss': None, 'cpu_time': None})
+        else:
+            records.append(assert_record("".join(result['stderr'] for result in reached), duration, result))
+    return records
+
+
+def run_asserts_batch(item, execute_batch=run_batch, execute=run_code, timeout=None):
+    """
+        run the complete test script once, with each assert wrapped so that the script goes on
+        after a failed one. the verdicts are those of run_asserts: an assert fails once anything
+        up to it wrote to stderr. the own result of every assert is kept as its outcome
+    """
+    split = split_prefixes(item)
+    if split is None:  # a statement spans two asserts, fall back to re-running the prefixes
+        return run_asserts(item, execute, timeout)
+    segments, assert_segments = split
+
+    results = []
+    if segments:
+        code = "".join(source for source, _ in segments)
+        cuts = [offset + source.count('\n') for source, offset in segments]
+        results = execute_batch(code, cuts) if timeout is None else execute_batch(code, cuts, timeout=timeout)
+
+    records = []
+    for index in assert_segments:
+        if isinstance(index, str):
+            records.append({'verdict': 'fail', 'stderr': index, 'duration': 0.0, 'peak_rss': None,
+                            'cpu_time': None, 'outcome': error_class(index)})
+            continue
+        result = results[index] if index < len(results) else {}
+        # the growing script would stop at the first failure, so only the stderr up to it counts
+        errors = ""
+        timed_out = False
+        for reached in results[:index + 1]:
+            if reached['timed_out']:
+                timed_out = True
+                break
+            errors += reached['stderr']
+            if is_failure(errors):
+                break
+        if timed_out and not is_failure(errors):
+            verdict = 'skipped' if records and records[-1]['verdict'] in ('timeout', 'skipped') else 'timeout'
+            record = {'verdict': verdict, 'stderr': "timeout error" if verdict == 'timeout' else '',
+                      'duration': result.get('duration', 0.0), 'peak_rss': None, 'cpu_time': None}
+        else:
+            record = assert_record(errors, result.get('duration', 0.0), result)
+        record['outcome'] = result.get('outcome')
+        records.append(record)
+    return records
+
+
+def evaluate_task_incremental(item, execute_session=run_session, execute=run_code, timeout=None):
+    """
+        the number of asserts and failed asserts, executed incrementally
+    """
+    return count_wrong(run_asserts_incremental(item, execute_session, execute, timeout))
+
+
+def canonical_script(item):
+    """
+        the complete test script with the canonical solution in place of the generated one
+    """
+    code, lines = build_test_script(dict(item, solution=item['prompt'] + item['canonical_solution']))
+    return code + ''.join(line + '\n' for line in lines)
+
+
+def task_libraries(item):
+    """
+        the preloadable libraries imported by the solution, the canonical solution or the tests of a task
+    """
+    code, lines = build_test_script(item)
+    return preload_group(code + '\n'.join(lines))
+
+
+def executors(executor='subprocess', server=None, limits=None, cache=None, profile=False):
+    """
+        the run_code, run_session and run_batch style functions of a backend, and the timed
+        run_code used to measure the canonical solution. with profile, the executions report
+        their phases, see job_phases
+    """
+    execute = run_code
+    execute_session = run_session
+    execute_batch = run_batch
+    if executor == 'pipe':
+        execute = run_code_pipe
+    elif executor == 'forkserver':
+        execute = server.run_code
+        execute_session = server.run_session
+        execute_batch = server.run_batch
+    if limits:
+        execute = functools.partial(execute, limits=limits)
+        execute_session = functools.partial(execute_session, limits=limits)
+        execute_batch = functools.partial(execute_batch, limits=limits)
+    if profile:
+        execute = functools.partial(execute, profile=True)
+        execute_session = functools.partial(execute_session, profile=True)
+        execute_batch = functools.partial(execute_batch, profile=True)
+
+    measure = timed(execute)
+    if cache is not None:
+        context = json.dumps(limits, sort_keys=True) if limits else ''
+        measure = cache.timed(execute, context)
+        execute = cache.cached(execute, context)
+        execute_session = cache.cached_session(execute_session, context)
+        execute_batch = cache.cached_batch(execute_batch, context)
+    return execute, execute_session, execute_batch, measure
+
+
+def job_phases(records):
+    """
+        the seconds of every phase summed over the profiled executions of a job, with the seconds
+        of each imported module under 'imports'. None when none of them was profiled, e.g. all cached
+    """
+    profiled = [record['phases'] for record in records if record.get('phases')]
+    if not profiled:
+        return None
+    phases = dict.fromkeys(PHASES, 0.0)
+    imports = {}
+    for times in profiled:
+        for phase in PHASES:
+            phases[phase] += times[phase]
+        for module, seconds in times['imports'].items():
+            imports[module] = imports.get(module, 0.0) + seconds
+    phases['imports'] = imports
+    return phases
+
+
+def print_phases(rows, top=10):
+    """
+        where the time of the profiled jobs went: the seconds per phase and model, the slowest
+        jobs with their most expensive phase and the imports that cost the most.
+        rows hold the model, the task_id and the job_phases of every job
+    """
+    rows = [row for row in rows if row.get('phases')]
+    print(f"{'model':<12} {'tasks':>5} " + ' '.join(f"{phase:>10}" for phase in PHASES) + f" {'total':>10}")
+    for model in dict.fromkeys(row['model'] for row in rows):
+        measured = [row['phases'] for row in rows if row['model'] == model]
+        totals = [sum(phases[phase] for phases in measured) for phase in PHASES]
+        print(f"{model:<12} {len(measured):>5} " + ' '.join(f"{total:>9.1f}s" for total in totals)
+              + f" {sum(totals):>9.1f}s")
+
+    print("\nslowest tasks")
+    for row in sorted(rows, key=lambda row: -sum(row['phases'][phase] for phase in PHASES))[:top]:
+        slowest = max(PHASES, key=lambda phase: row['phases'][phase])
+        print(f"{row['model']} {row['task_id']}: {sum(row['phases'][phase] for phase in PHASES):.2f}s, "
+              f"most in {slowest} ({row['phases'][slowest]:.2f}s)")
+
+    imports = {}
+    importers = {}
+    for row in rows:
+        for module, seconds in row['phases']['imports'].items():
+            imports[module] = imports.get(module, 0.0) + seconds
+            importers[module] = importers.get(module, 0) + 1
+    print("\nmost expensive imports")
+    for module, seconds in sorted(imports.items(), key=lambda entry: -entry[1])[:top]:
+        print(f"{module}: {seconds:.1f}s over {importers[module]} tasks, "
+              f"{seconds / importers[module] * 1e3:.0f}ms per task")
+
+
+def adaptive_timeout(item, measure, multiplier=10, floor=5, ceiling=60):
+    """
+        the timeout of a task: the runtime of the complete test script with the canonical
+        solution times the multiplier, at least floor and at most ceiling seconds
+    """
+    errors, duration = measure(canonical_script(item), timeout=ceiling)
+    if is_failure(errors):  # the canonical solution itself fails here, keep the fixed timeout
+        return ceiling
+    return min(ceiling, max(floor, multiplier * duration))
+
+
+def evaluate_samples(datas, evaluate_job, ks, key=None):
+    """
+        run every distinct sample of every task once and print pass@k.
+        a sample is correct when all its asserts pass. with key, the samples
+        with the same key are run once, see unique_samples
+    """
+    task_counts = []
+    samples = 0
+    unique = 0
+    for item in datas:
+        solutions, counts = unique_samples(item, key)
+        correct = 0
+        for index, (solution, count) in enumerate(zip(solutions, counts)):
+            _, wrong_num = evaluate_job(dict(item, solution=solution), f"{item['task_id']}{SAMPLE_SEPARATOR}{index}")
+            if wrong_num == 0:
+                correct += count
+        task_counts.append((sum(counts), correct))
+        samples += sum(counts)
+        unique += len(solutions)
+
+    print(f"{len(task_counts)} tasks, {samples} samples, {unique} {'equivalence classes' if key else 'unique'}")
+    for k, score in mean_pass_at_k(task_counts, ks).items():
+        print(f"pass@{k}: {score}" if score is not None else f"pass@{k}: fewer than {k} samples per task")
+
+
+def tolerances(rtol=None, atol=None):
+    """
+        the (rtol, atol) of the tolerant comparison, None to keep the exact == asserts
+    """
+    if rtol is None and atol is None:
+        return None
+    return [RTOL if rtol is None else rtol, ATOL if atol is None else atol]
+
+
+def resource_limits(max_memory=None, max_cpu=None, max_open_files=None):
+    """
+        the limits dict of the sandbox from the command line options, memory in MB
+    """
+    limits = {}
+    if max_memory:
+        limits['address_space'] = max_memory * 1024 * 1024
+    if max_cpu:
+        limits['cpu_seconds'] = max_cpu
+    if max_open_files:
+        limits['open_files'] = max_open_files
+    return limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="evaluate the LLM generated code on RWPB")
+    parser.add_argument('--file', default='./LLMGeneratedCode/rwpb-llama3.json', help="json file of LLM's output")
+    parser.add_argument('--executor', choices=['subprocess', 'pipe', 'forkserver', 'async'], default='subprocess',
+                        help="launch a new interpreter on a temporary file or on code sent over a pipe "
+                             "per execution, fork it from a pre-warmed parent, or keep --concurrency "
+                             "interpreters in flight from an asyncio loop")
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count(),
+                        help="sandboxes in flight with the async executor")
+    parser.add_argument('--preload', nargs='*', default=['torch', 'numpy'],
+                        help="libraries imported once by the fork server")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="thread count of torch and numpy in the sandbox, the library default if not given")
+    parser.add_argument('--route-imports', action='store_true',
+                        help="with the fork server, preload exactly the libraries each task imports instead of --preload")
+    parser.add_argument('--max-servers', type=int, default=2,
+                        help="fork servers kept running with --route-imports, the least recently used one is "
+                             "closed to start the server of another library group")
+    parser.add_argument('--mode', choices=['cumulative', 'incremental', 'batch'], default='cumulative',
+                        help="re-run the growing test script per assert, run the setup once and each assert "
+                             "incrementally, or run the whole test script once with every assert wrapped")
+    parser.add_argument('--cache', default=None, help="sqlite file caching the results of unchanged executions")
+    parser.add_argument('--cache-size', type=int, default=200000, help="maximum number of cached results")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds per execution")
+    parser.add_argument('--max-memory', type=int, default=None, help="address space limit of an execution in MB")
+    parser.add_argument('--max-cpu', type=int, default=None, help="CPU time limit of an execution in seconds")
+    parser.add_argument('--max-open-files', type=int, default=None, help="open file limit of an execution")
+    parser.add_argument('--adaptive-timeout', action='store_true',
+                        help="derive the timeout of each task from the runtime of its canonical solution")
+    parser.add_argument('--timeout-multiplier', type=float, default=10)
+    parser.add_argument('--timeout-floor', type=float, default=5, help="the shortest adaptive timeout in seconds")
+    parser.add_argument('--k', type=int, nargs='*', default=None,
+                        help="report pass@k for these k, from the n samples in item['solutions'] of every task")
+    parser.add_argument('--rtol', type=float, default=None,
+                        help="compare the results of == asserts at this relative tolerance")
+    parser.add_argument('--atol', type=float, default=None,
+                        help="compare the results of == asserts at this absolute tolerance")
+    parser.add_argument('--normalize', action='store_true',
+                        help="with --k, run the samples that only differ in comments, docstrings, "
+                             "formatting or local names once")
+    parser.add_argument('--results', default=None,
+                        help="jsonl file (or .parquet directory) receiving one row per assert, "
+                             "tasks already completed in it are not executed again")
+    parser.add_argument('--run-dir', default=None,
+                        help="directory holding the manifest, the per-assert results and the job completion markers")
+    parser.add_argument('--resume', action='store_true', help="continue the run in --run-dir, skipping finished tasks")
+    parser.add_argument('--queue', default=None,
+                        help="job directory shared by the machines, the tasks are queued there and run by workers")
+    parser.add_argument('--worker', action='store_true', help="run the jobs of --queue until all of them are finished")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes started by --worker")
+    parser.add_argument('--job-timeout', type=float, default=600,
+                        help="seconds per task run by a queue worker, a claim is taken over after twice as long")
+    parser.add_argument('--attempts', type=int, default=3,
+                        help="claims of a queued task before it fails without a result, e.g. when it kills its workers")
+    parser.add_argument('--profile', action='store_true',
+                        help="time the startup, import, definition, setup and assert phases of every execution "
+                             "and print where the time went")
+    args = parser.parse_args()
+    if args.run_dir and args.results:
+        parser.error("--run-dir keeps the per-assert results in the run directory, it cannot be combined with --results")
+    if args.queue and args.k:
+        parser.error("--queue evaluates one solution per task, it cannot be combined with --k")
+    if args.executor == 'async' and (args.mode != 'cumulative' or args.adaptive_timeout or args.cache
+                                     or args.queue or args.k or args.profile):
+        parser.error("the async executor runs --mode cumulative without --adaptive-timeout, --cache, --queue, "
+                     "--k or --profile")
+
+    if args.worker:
+        if not args.queue:
+            parser.error("--worker needs --queue")
+        run_workers(args.queue, args.workers, args.executor, args.preload, args.cache, args.cache_size, args.threads)
+        return
+
+    file_name = args.file
+
+    datas = iter_records(file_name)  # one task at a time
+
+    if args.threads:
+        limit_threads(args.threads)
+
+    limits = resource_limits(args.max_memory, args.max_cpu, args.max_open_files)
+    tolerance = tolerances(args.rtol, args.atol)
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache, max_entries=args.cache_size)
+
+    servers = {}  # one fork server per preloaded library group, started on first use, least recently used first
+
+    def backend(item):
+        server = None
+        if args.executor == 'forkserver':
+            group = task_libraries(item) if args.route_imports else tuple(args.preload)
+            if group not in servers:
+                while len(servers) >= max(1, args.max_servers):  # each one holds its own copy of the libraries
+                    servers.pop(next(iter(servers))).close()
+                servers[group] = ForkServer(preload=group)
+                servers[group].start()
+            server = servers[group] = servers.pop(group)
+        return executors(args.executor, server, limits, cache, args.profile)
+
+    run = None
+    sink = None
+    if args.run_dir:
+        config = {'files': [os.path.abspath(file_name)], 'mode': args.mode, 'timeout': args.timeout,
+                  'adaptive_timeout': args.adaptive_timeout, 'timeout_multiplier': args.timeout_multiplier,
+                  'timeout_floor': args.timeout_floor}
+        if limits:
+            config['limits'] = limits
+        if tolerance:
+            config['tolerance'] = tolerance
+        if args.k:
+            config['k'] = args.k
+            config['normalize'] = args.normalize
+        run = RunDirectory(args.run_dir, config, resume=args.resume)
+    elif args.results:
+        sink = open_sink(args.results)
+    model = model_name(file_name)
+
+    queue = None
+    if args.queue:
+        queue = JobQueue(args.queue)
+        options = {'mode': args.mode, 'timeout': args.timeout, 'job_timeout': args.job_timeout,
+                   'adaptive_timeout': args.adaptive_timeout, 'timeout_multiplier': args.timeout_multiplier,
+                   'timeout_floor': args.timeout_floor, 'limits': limits, 'tolerance': tolerance}
+        if args.profile:
+            options['profile'] = True
+        queue.create(options, lease=2 * args.job_timeout, attempts=args.attempts)
+        queued = sum(1 for item in iter_records(file_name) if queue.put(model, item))
+        queue.close()
+        print(f"{queued} tasks queued in {args.queue}, "
+              f"run them with: python evaluate.py --queue {args.queue} --worker --workers N")
+
+    def finished_job(task_id):
+        """
+            the number of asserts and failed asserts of a job that finished before, None if it did not
+        """
+        summary = run.summary(model, task_id) if run is not None else None
+        if summary is not None:
+            # finished before the run was interrupted
+            return summary['assert_num'], summary['wrong_num']
+        if sink is not None and (model, task_id) in sink.jobs:
+            return job_counts(sink.jobs[(model, task_id)])
+        return None
+
+    profiles = []  # the model, task_id and job_phases of every profiled job
+
+    def finish_job(task_id, records, duration, fingerprint=None):
+        """
+            write the rows of a job to the run directory or the results, and count its failed asserts.
+            the fingerprint is the one of the worker that ran the job, when it ran elsewhere
+        """
+        if args.profile:
+            profiles.append({'model': model, 'task_id': task_id, 'phases': job_phases(records)})
+        assert_num, wrong_num = count_wrong(records)
+        rows = assert_rows(model, task_id, records, fingerprint)
+        if run is not None:
+            run.finish_job(rows, {'model': model, 'task_id': task_id, 'assert_num': assert_num,
+                                  'wrong_num': wrong_num, 'duration': duration, 'fingerprint': rows[0]['fingerprint']})
+        elif sink is not None:
+            sink.write_job(rows)
+        return assert_num, wrong_num
+
+    def evaluate_job(item, task_id):
+        """
+            the number of asserts and failed asserts of one job, taken from the run directory
+            or the results when it finished before
+        """
+        counts = finished_job(task_id)
+        if counts is not None:
+            return counts
+
+        start = time.monotonic()
+        fingerprint = None
+        if queue is not None:  # run by a worker
+            result = queue.wait(job_name(model, task_id))
+            if result.get('error'):
+                print(f"{task_id}: {result['error']}")
+            records = result['asserts']
+            duration = result['duration']
+            fingerprint = result.get('fingerprint')
+        else:
+            if tolerance:
+                item = tolerant_item(item, *tolerance)
+            execute, execute_session, execute_batch, measure = backend(item)
+            timeout = args.timeout
+            if args.adaptive_timeout:
+                timeout = adaptive_timeout(item, measure, args.timeout_multiplier, args.timeout_floor, args.timeout)
+
+            if args.mode == 'incremental':
+                records = run_asserts_incremental(item, execute_session, execute, timeout)
+            elif args.mode == 'batch':
+                records = run_asserts_batch(item, execute_batch, execute, timeout)
+            else:
+                records = run_asserts(item, execute, timeout)
+            duration = time.monotonic() - start
+        return finish_job(task_id, records, duration, fingerprint)
+
+    def task_counts():
+        """
+            (task_id, number of asserts, number of failed asserts) of every task in file order
+        """
+        for item in datas:
+            if 'solution' not in item:  # a file with n samples per task, evaluate the first one
+                item = dict(item, solution=item['solutions'][0])
+            yield item['task_id'], *evaluate_job(item, item['task_id'])
+
+    async def task_counts_async():
+        """
+            task_counts with the executions of the unfinished tasks in flight together
+        """
+        finished = {}
+
+        def jobs():
+            for item in datas:
+                if 'solution' not in item:
+                    item = dict(item, solution=item['solutions'][0])
+                counts = finished_job(item['task_id'])
+                if counts is not None:
+                    finished[item['task_id']] = counts
+                    item = dict(item, unprocess_testcases='')  # nothing to run, only keeps the order
+                elif tolerance:
+                    item = tolerant_item(item, *tolerance)
+                yield item, item['task_id']
+
+        execute = functools.partial(run_code_async, limits=limits) if limits else run_code_async
+        results = []
+        async for item, task_id, records, duration in evaluate_async(jobs(), args.concurrency, execute,
+                                                                       args.timeout):
+            if task_id in finished:
+                results.append((task_id, *finished.pop(task_id)))
+            else:
+                results.append((task_id, *finish_job(task_id, records, duration)))
+        return results
+
+    if args.k:
+        try:
+            evaluate_samples(datas, evaluate_job, args.k, solution_fingerprint if args.normalize else None)
+            if args.profile:
+                print()
+                print_phases(profiles)
+        finally:
+            for server in servers.values():
+                server.close()
+            if cache is not None:
+                cache.close()
+            if sink is not None:
+                sink.close()
+            if run is not None:
+                run.close()
+        return
+
+    cnt = 0
+    t_pass = 0
+    t_partial_wrong = 0
+
+    try:
+        counts = asyncio.run(task_counts_async()) if args.executor == 'async' else task_counts()
+        for task_id, tmp_assert_num, tmp_wrong_num in counts:
+            cnt += 1
+
+            if tmp_wrong_num != tmp_assert_num and tmp_wrong_num != 0:
+                print(f"{task_id}")
+                t_partial_wrong += 1
+
+            if tmp_wrong_num == 0:
+                t_pass += 1
+    finally:
+        for server in servers.values():
+            server.close()
+        if cache is not None:
+            cache.close()
+        if sink is not None:
+            sink.close()
+        if run is not None:
+            run.close()
+
+    print(cnt)
+    print(f"pass rate: {(t_pass)/cnt}")
+    print(f"partial wrong rate: {(t_partial_wrong)/cnt}")
+    if args.profile:
+        print()
+        print_phases(profiles)
+
 
-print(cnt)
-print(f"pass rate: {(t_pass)/cnt}")
-print(f"partial wrong rate: {(t_partial_wrong)/cnt}")
+    # with open(os.path.join(file_name), 'w') as f:
+    #     json.dump(datas, f, indent=1, ensure_ascii=False)
 
 
-# with open(os.path.join(file_name), 'w') as f:
-#     json.dump(datas, f, indent=1, ensure_ascii=False)
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 # extract the function body from LLM's output
-import json
+import argparse
 import os
 import tempfile
 import re
@@ -8,6 +8,8 @@ import io
 import traceback
 import subprocess
 
+from extraction import extract_file
+
 def find_function_names(code):
     """
         obtain the function signature
@@ -70,12 +72,23 @@ def filter_unit_test(datas):
 
 
 
-# json file of LLM's output
-file_name = './rwpb-phi3.json'
+def main():
+    parser = argparse.ArgumentParser(description="extract the function body from LLM's output")
+    # json file of LLM's output
+    parser.add_argument('--file', default='./rwpb-phi3.json', help="json file of LLM's output, rewritten in place")
+    parser.add_argument('--extract-answer', action='store_true',
+                        help="also extract the code block from the response, as process_answer does")
+    parser.add_argument('--check-syntax', action='store_true',
+                        help="compile every solution and record its syntax error as syntax_error")
+    parser.add_argument('--repair', action='store_true',
+                        help="trim the prose around a solution that does not compile, if that fixes it")
+    args = parser.parse_args()
+
+    counts = extract_file(args.file, answers=args.extract_answer, check=args.check_syntax, repair_syntax=args.repair)
+    if args.check_syntax or args.repair:
+        print(f"{counts['tasks']} solutions, {counts['syntax_errors']} with a syntax error, "
+              f"{counts['repaired']} repaired")
 
-with open(file_name, 'r') as f:
-    datas = json.load(f)
-    filter_unit_test(datas)
 
-with open(file_name, 'w') as f:
-    json.dump(datas, f, indent=1, ensure_ascii=False)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# single pass extraction of the solution from LLM's output, same results as process_answer and filter_unit_test
+import re
+import traceback
+import warnings
+
+from loader import iter_records, write_records
+
+PYTHON_TAGS = '[/PYTHON]'  # text.strip('[PYTHON]').strip('[/PYTHON]') strips these characters
+FENCE = '```'
+PREAMBLES = ['Here', 'One approach']  # the first line starting at one of them is dropped
+CUT_POINTS = re.compile(r'# Test|# Example')  # the unit tests and examples after the solution
+DEFINITION = re.compile(r'(?:async\s+)?def\s|class\s')
+TOP_LEVEL_CODE = re.compile(r'(?:async\s+)?def\s|class\s|@|import\s|from\s+\S+\s+import\s')
+
+
+def drop_line(text, word):
+    """
+        remove the first `word` and the rest of its line, if a newline follows it
+    """
+    start = text.find(word)
+    if start == -1:
+        return text
+    end = text.find('\n', start + len(word))
+    if end == -1:
+        return text
+    return text[:start] + text[end + 1:]
+
+
+def extract_answer(text):
+    """
+        extract the function body, see process_answer in evaluate.py
+    """
+    text = text.strip(PYTHON_TAGS)
+
+    start = text.find(FENCE)
+    if start != -1:
+        end = text.find(FENCE, start + 3)
+        if end == -1:
+            text = text[start + 3:]
+        else:
+            text = text[start + 3:end]  # the first code block
+            if not text.startswith('\n'):  # in case starting with ```python
+                text = text[text.find('\n') + 1:]
+    else:
+        for word in PREAMBLES:
+            text = drop_line(text, word)
+
+    if text.startswith("markdown"):
+        text = text[8:]
+    if text.endswith('</s>'):
+        return text[:-4]
+    return text
+
+
+def cut_tests(solution):
+    """
+        cut the solution at the first unit test or example, see filter_unit_test in extract_function_body.py
+    """
+    match = CUT_POINTS.search(solution)
+    if match:
+        return solution[:match.start()]
+    return solution
+
+
+def extract_item(item, answers=True, tests=True):
+    """
+        extract the solution of one task in place, and every sample of item['solutions'] when there are n of them
+    """
+    if 'solutions' in item:
+        item['solutions'] = [extract_solution(solution, answers, tests) for solution in item['solutions']]
+    if 'solution' in item:
+        item['solution'] = extract_solution(item['solution'], answers, tests)
+    return item
+
+
+def extract_solution(solution, answers=True, tests=True):
+    """
+        one extracted solution
+    """
+    if answers:
+        solution = extract_answer(solution)
+    if tests:
+        solution = cut_tests(solution)
+    return solution
+
+
+def extract_batch(datas, answers=True, tests=True):
+    """
+        extract the solutions of a whole model file in place
+    """
+    for item in datas:
+        extract_item(item, answers, tests)
+    return datas
+
+
+def extract_file(file_name, output=None, answers=True, tests=True, check=False, repair_syntax=False):
+    """
+        extract the solutions of a model file and write them to output, the file itself by default.
+        the tasks are streamed, one at a time. with check, the syntax of every solution is
+        verified as well, see check_item. returns the number of tasks, syntax errors and repairs
+    """
+    counts = {'tasks': 0, 'syntax_errors': 0, 'repaired': 0}
+
+    def extracted():
+        for item in iter_records(file_name):
+            extract_item(item, answers, tests)
+            if check or repair_syntax:
+                check_item(item, repair_syntax)
+                counts['syntax_errors'] += bool(item['syntax_error'])
+                counts['repaired'] += item['repaired']
+            counts['tasks'] += 1
+            yield item
+
+    write_records(output or file_name, extracted())
+    return counts
+
+
+def compile_error(code):
+    """
+        the error the interpreter would report for code that does not compile, checked without running it
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            compile(code, '<sandbox>', 'exec', dont_inherit=True)
+    except Exception as e:
+        return "".join(traceback.format_exception_only(type(e), e))
+    return ""
+
+
+def trim_trailing_prose(code):
+    """
+        drop everything after the body of the last top level def or class
+    """
+    lines = code.split('\n')
+    last = None
+    for index, line in enumerate(lines):
+        if DEFINITION.match(line):
+            last = index
+    if last is None:
+        return code
+    for index in range(last + 1, len(lines)):
+        line = lines[index]
+        # the first unindented line that does not close a bracket or comment ends the body
+        if line.strip() and not line[0].isspace() and not line.startswith((')', ']', '}', '#')):
+            return '\n'.join(lines[:index]).rstrip() + '\n'
+    return code
+
+
+def trim_leading_prose(code):
+    """
+        drop the lines before the first top level import, decorator, def or class
+    """
+    lines = code.split('\n')
+    for index, line in enumerate(lines):
+        if TOP_LEVEL_CODE.match(line):
+            return '\n'.join(lines[index:])
+    return code
+
+
+def repair(code):
+    """
+        the code with its surrounding prose trimmed if that makes it compile, None otherwise
+    """
+    leading = trim_leading_prose(code)
+    for candidate in (trim_trailing_prose(code), leading, trim_trailing_prose(leading)):
+        if candidate != code and not compile_error(candidate):
+            return candidate
+    return None
+
+
+def check_item(item, repair_syntax=False):
+    """
+        compile the solution in process and record the error as item['syntax_error'],
+        empty for a solution that compiles. with repair_syntax a broken solution is replaced
+        by its repaired version when there is one, marked by item['repaired']
+    """
+    error = compile_error(item['solution'])
+    item['repaired'] = False
+    if error and repair_syntax:
+        repaired = repair(item['solution'])
+        if repaired is not None:
+            item['solution'] = repaired
+            item['repaired'] = True
+            error = ""
+    item['syntax_error'] = error
+    return item
+
+
+def check_batch(datas, repair_syntax=False):
+    """
+        check the syntax of every solution of a model file, see check_item
+    """
+    for item in datas:
+        check_item(item, repair_syntax)
+    return datas
@@ -0,0 +1,62 @@
+# static scan of the libraries a test script imports, used to route tasks to matching warm workers
+import argparse
+import ast
+import re
+from collections import Counter
+
+# the libraries worth keeping imported in a fork server, by top level module name
+PRELOADABLE = ['torch', 'numpy', 'scipy', 'cv2', 'PIL', 'pandas', 'sklearn']
+
+IMPORT_LINE = re.compile(r"^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w., ]+))", re.MULTILINE)
+
+
+def imported_modules(code):
+    """
+        the top level modules imported anywhere in the code, found without running it.
+        code that does not parse is scanned line by line instead
+    """
+    modules = set()
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        for match in IMPORT_LINE.finditer(code):
+            if match.group(1):
+                if not match.group(1).startswith('.'):
+                    modules.add(match.group(1).split('.')[0])
+            else:
+                for name in match.group(2).split(','):
+                    if name.strip():
+                        modules.add(name.split()[0].split('.')[0])
+        return modules
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.add(alias.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split('.')[0])
+    return modules
+
+
+def preload_group(code, preloadable=PRELOADABLE):
+    """
+        the preloadable libraries imported by the code in a fixed order, empty for pure python
+    """
+    modules = imported_modules(code)
+    return tuple(name for name in preloadable if name in modules)
+
+
+def main():
+    from evaluate import task_libraries
+    from loader import iter_records
+
+    parser = argparse.ArgumentParser(description="count the tasks of each library group")
+    parser.add_argument('--file', default='./LLMGeneratedCode/rwpb-llama3.json', help="json file of LLM's output")
+    args = parser.parse_args()
+
+    groups = Counter(task_libraries(item) for item in iter_records(args.file))
+    for group, count in groups.most_common():
+        print(f"{' '.join(group) or 'pure python'}: {count} tasks")
+
+
+if __name__ == '__main__':
+    main()
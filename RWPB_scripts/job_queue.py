@@ -0,0 +1,252 @@
+# a job queue in a directory shared over NFS, so that the workers of several machines evaluate
+# the (model, task) jobs of one run without a broker
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import time
+
+from run_dir import write_json_atomic
+
+
+def job_name(model, task_id):
+    return f"{model}__{task_id.replace('/', '_')}"
+
+
+class JobQueue:
+    """
+        queue_dir/manifest.json     the options every worker evaluates the jobs with
+        queue_dir/jobs/*.json       one file per (model, task) job holding the task record and its hash
+        queue_dir/claims/*.lock     the claim of a job by one worker
+        queue_dir/claims/*.attempts how many times the job was claimed
+        queue_dir/results/*.json    the table row and the per-assert records of a finished job
+        queue_dir/closed            written once every job of the run is queued
+        a job is claimed by hard linking a file of the worker to its lock, which is atomic on NFS as
+        well, and is finished once its result was renamed into place. a claim older than the lease,
+        e.g. of a worker that died, can be taken over by another worker. a job that raised in the worker,
+        or was claimed `attempts` times without finishing, gets a result failing all of its asserts
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs_dir = os.path.join(path, 'jobs')
+        self.claims_dir = os.path.join(path, 'claims')
+        self.results_dir = os.path.join(path, 'results')
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        self.closed_path = os.path.join(path, 'closed')
+
+    def create(self, options, lease, attempts=3):
+        """
+            set up the queue, or continue the queue in path when it was created with the same options
+        """
+        manifest = {'options': options, 'lease': lease, 'attempts': attempts}
+        if os.path.exists(self.manifest_path):
+            if self.manifest() != manifest:
+                raise SystemExit(f"{self.path} holds a queue with different options")
+        else:
+            for directory in (self.jobs_dir, self.claims_dir, self.results_dir):
+                os.makedirs(directory, exist_ok=True)
+            write_json_atomic(self.manifest_path, manifest)
+        if os.path.exists(self.closed_path):
+            os.remove(self.closed_path)  # more jobs may follow
+
+    def manifest(self):
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def put(self, model, item):
+        """
+            queue the job of a task, a job queued before with a different task record is replaced
+            and its result, claim count and lock dropped, so that the next worker takes it at once
+        """
+        name = job_name(model, item['task_id'])
+        path = os.path.join(self.jobs_dir, name + '.json')
+        digest = hashlib.sha256(json.dumps(item, sort_keys=True).encode()).hexdigest()
+        try:
+            with open(path, 'r') as f:
+                queued = json.load(f).get('hash')
+        except FileNotFoundError:
+            queued = None
+        if queued != digest:
+            write_json_atomic(path, {'model': model, 'item': item, 'hash': digest})
+            for stale in (os.path.join(self.results_dir, name + '.json'),
+                          os.path.join(self.claims_dir, name + '.attempts'),
+                          os.path.join(self.claims_dir, name + '.lock')):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        return name
+
+    def close(self):
+        write_json_atomic(self.closed_path, {'closed': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+    def result(self, name):
+        """
+            the result of a job, None if it has not finished
+        """
+        try:
+            with open(os.path.join(self.results_dir, name + '.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def wait(self, name, poll=1.0):
+        """
+            the result of a job once a worker finished it
+        """
+        while True:
+            result = self.result(name)
+            if result is not None:
+                return result
+            time.sleep(poll)
+
+    def finished(self):
+        """
+            every job is queued and has a result
+        """
+        if not os.path.exists(self.closed_path):
+            return False
+        done = set(os.listdir(self.results_dir))
+        return all(file_name in done for file_name in os.listdir(self.jobs_dir) if file_name.endswith('.json'))
+
+    def claim(self, worker, lease, attempts=3):
+        """
+            the name and job of an unfinished job the worker now owns, None when there is none to claim.
+            a job claimed `attempts` times before is finished with an error result instead
+        """
+        done = set(os.listdir(self.results_dir))
+        for file_name in sorted(os.listdir(self.jobs_dir)):
+            if not file_name.endswith('.json') or file_name in done:
+                continue
+            name = file_name[:-5]
+            if self.lock(name, worker, lease):
+                if self.result(name) is not None:  # finished since the listing
+                    continue
+                with open(os.path.join(self.jobs_dir, file_name), 'r') as f:
+                    job = json.load(f)
+                claimed = self.attempt(name)
+                if claimed > attempts:
+                    self.complete(name, error_result(job, f"gave up after {attempts} attempts, "
+                                                          f"the workers running it died"), job.get('hash'))
+                    continue
+                return name, job
+        return None
+
+    def attempt(self, name):
+        """
+            count one more claim of a job, only the worker holding its lock writes the count
+        """
+        path = os.path.join(self.claims_dir, name + '.attempts')
+        try:
+            with open(path, 'r') as f:
+                count = json.load(f) + 1
+        except FileNotFoundError:
+            count = 1
+        write_json_atomic(path, count)
+        return count
+
+    def lock(self, name, worker, lease):
+        """
+            take the lock of a job, breaking a lock older than the lease
+        """
+        lock = os.path.join(self.claims_dir, name + '.lock')
+        try:
+            age = time.time() - os.stat(lock).st_mtime
+        except FileNotFoundError:
+            age = None
+        if age is not None:
+            if age < lease:
+                return False
+            stale = f"{lock}.stale.{worker}"
+            try:
+                os.rename(lock, stale)  # only one worker gets to break it
+            except FileNotFoundError:
+                return False
+            os.remove(stale)
+        mine = f"{lock}.{worker}"
+        with open(mine, 'w') as f:
+            f.write(worker)
+        try:
+            os.link(mine, lock)
+        except OSError:
+            pass  # the link count tells whether it worked, also when the reply of the server got lost
+        try:
+            return os.stat(mine).st_nlink == 2
+        finally:
+            os.remove(mine)
+
+    def complete(self, name, result, digest=None):
+        """
+            store the result of a job, unless the job was requeued with another task record since
+            it was claimed, the digest of the claimed record, while it ran
+        """
+        if digest is not None:
+            with open(os.path.join(self.jobs_dir, name + '.json'), 'r') as f:
+                if json.load(f).get('hash') != digest:
+                    return False
+        write_json_atomic(os.path.join(self.results_dir, name + '.json'), result)
+        return True
+
+
+def error_result(job, error):
+    """
+        the result of a job that could not be evaluated, every assert of the task fails with the error
+    """
+    from scheduler import job_verdict
+
+    assert_num = sum(line.startswith('assert') for line in job['item']['unprocess_testcases'].split('\n'))
+    records = [{'verdict': 'fail', 'stderr': f"worker error: {error}\n", 'duration': 0.0} for _ in range(assert_num)]
+    return {
+        'model': job['model'],
+        'task_id': job['item']['task_id'],
+        'assert_num': assert_num,
+        'wrong_num': assert_num,
+        'verdict': job_verdict(assert_num, assert_num),
+        'duration': 0.0,
+        'job_timeout': False,
+        'error': error,
+        'asserts': records,
+    }
+
+
+def work(path, executor='subprocess', preload=(), cache_path=None, cache_size=200000, threads=None, poll=1.0):
+    """
+        run the jobs of the queue one at a time until every job has a result
+    """
+    from scheduler import init_worker, run_job, DEFAULT_OPTIONS
+
+    queue = JobQueue(path)
+    manifest = queue.manifest()
+    options = dict(DEFAULT_OPTIONS, **manifest['options'])
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    init_worker(executor, preload, cache_path, cache_size, threads)
+    finished = 0
+    while True:
+        claimed = queue.claim(worker, manifest['lease'], manifest.get('attempts', 3))
+        if claimed is None:
+            if queue.finished():
+                return finished
+            time.sleep(poll)
+            continue
+        name, job = claimed
+        try:
+            result = run_job(job['model'], job['item'], options)
+        except Exception as e:  # e.g. a fork server that died, the job would fail again on every worker
+            result = error_result(job, f"{type(e).__name__}: {e}")
+        if queue.complete(name, result, job.get('hash')):
+            finished += 1
+
+
+def run_workers(path, workers=1, executor='subprocess', preload=(), cache_path=None, cache_size=200000,
+                threads=None):
+    """
+        run `workers` processes of work on this machine until the queue is finished
+    """
+    if workers == 1:
+        return work(path, executor, preload, cache_path, cache_size, threads)
+    processes = [multiprocessing.Process(target=work, args=(path, executor, preload, cache_path, cache_size, threads))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,135 @@
+# streaming reader and writer of task records, one record in memory at a time
+import json
+import os
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = ' \t\r\n'
+NUMBER_CHARS = '0123456789.eE+-'
+
+
+def iter_records(path, chunk_size=CHUNK_SIZE):
+    """
+        yield the elements of the top level array of a json file without loading the whole array,
+        or the records of a json lines file line by line. the format is told from the first
+        character that is not whitespace, not from the extension
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if first_char(f, chunk_size) == '[':
+            yield from iter_array(f, chunk_size)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def first_char(f, chunk_size=CHUNK_SIZE):
+    """
+        the first character of a text file that is not whitespace, '' for an empty file.
+        the file is left at its start
+    """
+    while True:
+        chunk = f.read(chunk_size)
+        stripped = chunk.lstrip(WHITESPACE)
+        if stripped or not chunk:
+            char = stripped[:1]
+            break
+    f.seek(0)
+    return char
+
+
+def iter_array(f, chunk_size=CHUNK_SIZE):
+    """
+        decode the elements of a json array from a text file one by one
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def next_char():
+        # the next character that is not whitespace, '' at the end of the file
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            fill()
+
+    if next_char() != '[':
+        raise ValueError("expected a json array")
+    position += 1
+    if next_char() == ']':
+        return
+    while True:
+        start = position
+        try:
+            record, end = decoder.raw_decode(buffer, start)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()  # the value continues in the next chunk
+            continue
+        if isinstance(record, (int, float)) and not eof and not buffer[end:].strip(NUMBER_CHARS):
+            fill()  # the number could go on in the next chunk, decode it again
+            continue
+        position = end
+        separator = next_char()
+        if separator not in (',', ']'):
+            raise ValueError(f"expected ',' or ']' after an element, found {separator or 'the end of the file'!r}")
+        yield record
+        position += 1
+        if separator == ']':
+            return
+        next_char()
+
+
+class open_records:
+    """
+        with open_records(path) as reader: for record in reader: ...
+        the same usage as jsonlines.open(path, "r")
+    """
+
+    def __init__(self, path):
+        self.records = iter_records(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.records.close()
+
+    def __iter__(self):
+        return self.records
+
+
+def write_records(path, records):
+    """
+        write the records as they come, as json lines for .jsonl and otherwise as the json
+        array json.dump(records, f, indent=1, ensure_ascii=False) would write.
+        the file is replaced at the end, so path may be the file the records are read from
+    """
+    tmp = path + '.tmp'
+    count = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        else:
+            for record in records:
+                f.write('[\n' if count == 0 else ',\n')
+                text = json.dumps(record, indent=1, ensure_ascii=False)
+                f.write('\n'.join(' ' + line for line in text.split('\n')))
+                count += 1
+            f.write('\n]' if count else '[]')
+    os.replace(tmp, path)
+    return count
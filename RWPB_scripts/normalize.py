@@ -0,0 +1,163 @@
+# canonical form of an extracted solution, so that solutions differing only in comments, docstrings,
+# whitespace or the names of local variables are executed once
+import argparse
+import ast
+import hashlib
+from collections import Counter
+
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+INTROSPECTION = {'locals', 'vars', 'eval', 'exec', 'dir'}  # calls that can observe the local names
+
+
+def strip_docstrings(tree):
+    """
+        remove the string statements that have no effect, docstrings included
+    """
+    for node in ast.walk(tree):
+        for field in ('body', 'orelse', 'finalbody'):
+            body = getattr(node, field, None)
+            if not isinstance(body, list) or not body or not isinstance(body[0], ast.stmt):
+                continue
+            kept = [stmt for stmt in body
+                    if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)
+                            and isinstance(stmt.value.value, str))]
+            if not kept and field == 'body' and not isinstance(node, ast.Module):
+                kept = [ast.Pass()]
+            setattr(node, field, kept)
+    return tree
+
+
+def scope_nodes(function):
+    """
+        the nodes of a function body outside of nested functions, lambdas and classes,
+        and the nested scopes themselves
+    """
+    own, nested = [], []
+    stack = list(reversed(function.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, SCOPES):
+            nested.append(node)
+            continue
+        own.append(node)
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+    return own, nested
+
+
+def local_names(function):
+    """
+        the local variables of a function that can be renamed without changing what it does: assigned in
+        the function itself outside of comprehension targets, and neither a parameter, declared global or
+        nonlocal, bound in another way, nor used by a nested scope. empty when the function inspects its
+        own namespace
+    """
+    own, nested = scope_nodes(function)
+    stored = []
+    excluded = {arg.arg for arg in ast.walk(function.args) if isinstance(arg, ast.arg)}
+    # a comprehension variable is local to the comprehension, the same name can be a global elsewhere
+    targets = {id(name) for node in own if isinstance(node, ast.comprehension)
+               for name in ast.walk(node.target)}
+    for node in own:
+        if id(node) in targets:
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            if node.id not in stored:
+                stored.append(node.id)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            excluded.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            excluded.add(node.name)
+        elif isinstance(node, ast.alias):
+            excluded.add((node.asname or node.name).split('.')[0])
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            excluded.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            excluded.add(node.rest)
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+              and node.func.id in INTROSPECTION):
+            return []
+    for scope in nested:
+        if not isinstance(scope, ast.Lambda):
+            excluded.add(scope.name)
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Name):
+                excluded.add(node.id)
+            elif isinstance(node, ast.arg):
+                excluded.add(node.arg)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                excluded.update(node.names)
+    return [name for name in stored if name not in excluded]
+
+
+def fresh_prefix(tree):
+    """
+        a prefix for the new local names that no identifier of the code starts with
+    """
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    names |= {node.arg for node in ast.walk(tree) if isinstance(node, ast.arg)}
+    names |= {node.attr for node in ast.walk(tree) if isinstance(node, ast.Attribute)}
+    prefix = '_v'
+    while any(name.startswith(prefix) for name in names):
+        prefix = '_' + prefix
+    return prefix
+
+
+def rename_locals(tree):
+    """
+        rename the local variables of every function to prefix0, prefix1, ... in order of appearance
+    """
+    prefix = fresh_prefix(tree)
+    for function in [node for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]:
+        names = {name: f'{prefix}{index}' for index, name in enumerate(local_names(function))}
+        if not names:
+            continue
+        for node in scope_nodes(function)[0]:
+            if isinstance(node, ast.Name) and node.id in names:
+                node.id = names[node.id]
+    return tree
+
+
+def normalized_source(code):
+    """
+        the solution without comments, docstrings and formatting, with its local variables renamed.
+        None for code that does not parse
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    return ast.unparse(rename_locals(strip_docstrings(tree)))
+
+
+def solution_fingerprint(code):
+    """
+        hash of the normalized solution, equal for solutions that only differ in comments, docstrings,
+        whitespace or local names. code that does not parse is hashed as it is
+    """
+    source = normalized_source(code)
+    text = 'raw\0' + code if source is None else 'ast\0' + source
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def main():
+    from loader import iter_records
+    from pass_at_k import task_samples
+
+    parser = argparse.ArgumentParser(description="count the equivalence classes of the solutions")
+    parser.add_argument('--files', nargs='*', default=['./LLMGeneratedCode/rwpb-llama3.json'],
+                        help="json files of LLM's output")
+    args = parser.parse_args()
+
+    identical = set()
+    classes = Counter()
+    for file_name in args.files:
+        for item in iter_records(file_name):
+            for solution in task_samples(item):
+                identical.add((item['task_id'], solution))
+                classes[(item['task_id'], solution_fingerprint(solution))] += 1
+    total = sum(classes.values())
+    print(f"{total} solutions, {len(identical)} distinct, {len(classes)} equivalence classes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# pass@k over n generated samples per task
+SAMPLE_SEPARATOR = '@'  # the job of the i-th unique sample of a task is named task_id@i
+
+
+def task_samples(item):
+    """
+        the generated solutions of a task: item['solutions'] when the file holds n samples per task,
+        otherwise the single item['solution']
+    """
+    if 'solutions' in item:
+        return item['solutions']
+    return [item['solution']]
+
+
+def unique_samples(item, key=None):
+    """
+        the distinct solutions of a task in the order they first appear, and how often each one occurs.
+        with key, e.g. solution_fingerprint, solutions with the same key count as one
+    """
+    first = {}
+    counts = {}
+    for solution in task_samples(item):
+        group = solution if key is None else key(solution)
+        first.setdefault(group, solution)
+        counts[group] = counts.get(group, 0) + 1
+    return list(first.values()), list(counts.values())
+
+
+def estimate_pass_at_k(n, c, k):
+    """
+        the unbiased estimate of pass@k from n samples with c correct ones, 1 - C(n-c, k) / C(n, k),
+        computed as a product so that it stays exact for large n
+    """
+    if n - c < k:
+        return 1.0
+    estimate = 1.0
+    for i in range(n - c + 1, n + 1):
+        estimate *= 1.0 - k / i
+    return 1.0 - estimate
+
+
+def mean_pass_at_k(task_counts, ks):
+    """
+        the mean pass@k over the tasks, task_counts holds (n, c) per task.
+        a task with fewer than k samples does not count towards pass@k
+    """
+    scores = {}
+    for k in ks:
+        estimates = [estimate_pass_at_k(n, c, k) for n, c in task_counts if n >= k]
+        scores[k] = sum(estimates) / len(estimates) if estimates else None
+    return scores
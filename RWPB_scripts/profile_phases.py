@@ -0,0 +1,55 @@
+# where the time of an evaluation goes: interpreter startup, library imports, the definition of the
+# solution, the test setup and the asserts, measured by profiling the executions of an ordinary sweep
+# with the given executor and mode. evaluate.py and scheduler.py print the same report with --profile
+import argparse
+import csv
+import glob
+
+import scheduler
+from evaluate import print_phases
+from sandbox import PHASES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="profile the phases of the evaluation of every task")
+    parser.add_argument('--files', nargs='*', default=['./LLMGeneratedCode/rwpb-llama3.json'],
+                        help="json files of LLM's output, glob patterns are expanded")
+    parser.add_argument('--executor', choices=['subprocess', 'pipe', 'forkserver'], default='subprocess')
+    parser.add_argument('--mode', choices=['cumulative', 'incremental', 'batch'], default='cumulative')
+    parser.add_argument('--preload', nargs='*', default=['torch', 'numpy'],
+                        help="libraries imported once by the fork server")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds per execution")
+    parser.add_argument('--top', type=int, default=10, help="the number of slowest tasks and imports to list")
+    parser.add_argument('--output', default=None, help="csv file receiving the phases of every model and task")
+    args = parser.parse_args()
+
+    file_names = []
+    for pattern in args.files:
+        file_names.extend(sorted(glob.glob(pattern)))
+
+    scheduler.init_worker(args.executor, args.preload)
+    options = dict(scheduler.DEFAULT_OPTIONS, mode=args.mode, timeout=args.timeout, profile=True)
+    rows = []
+    try:
+        for _, model, item in scheduler.iter_jobs(file_names):
+            row = scheduler.run_job(model, item, options)
+            rows.append({'model': model, 'task_id': item['task_id'], 'verdict': row['verdict'], 'phases': row['phases']})
+    finally:
+        if scheduler.server is not None:
+            scheduler.server.close()
+
+    print_phases(rows, args.top)
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['model', 'task_id', 'verdict'] + PHASES + ['total'])
+            writer.writeheader()
+            for row in rows:
+                phases = row['phases'] or {}  # None when every execution timed out
+                writer.writerow(dict({phase: phases.get(phase) for phase in PHASES}, model=row['model'],
+                                     task_id=row['task_id'], verdict=row['verdict'],
+                                     total=sum(phases.get(phase, 0.0) for phase in PHASES)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# on-disk cache of execution results, so that unchanged tasks are not executed again
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from environment import environment_fingerprint
+from sandbox import is_failure, error_class
+
+
+NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'lustre', 'gpfs', 'fuse.sshfs', 'ceph', 'glusterfs')
+
+
+def network_filesystem(path):
+    """
+        whether the path is on a network filesystem, read from /proc/mounts and False where it is missing
+    """
+    try:
+        with open('/proc/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    directory = os.path.dirname(os.path.abspath(path))
+    mount = max((entry for entry in mounts
+                 if directory == entry[0] or directory.startswith(entry[0].rstrip('/') + '/')),
+                key=lambda entry: len(entry[0]), default=('/', ''))
+    return mount[1] in NETWORK_FILESYSTEMS
+
+
+class ResultCache:
+    """
+        results of run_code and run_session keyed by a hash of the executed code and
+        the environment fingerprint, the least recently used entries are evicted. machines with
+        different environments can share one cache, each of them only hits its own entries
+    """
+
+    def __init__(self, path, max_entries=200000, fingerprint=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.fingerprint = fingerprint or environment_fingerprint()
+        self.puts = 0
+        self.conn = sqlite3.connect(path, timeout=60)
+        # WAL needs shared memory between the processes, which a network filesystem does not provide
+        self.conn.execute("PRAGMA journal_mode=DELETE" if network_filesystem(path) else "PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            verdict TEXT,
+            error_class TEXT,
+            stderr TEXT,
+            duration REAL,
+            timeout REAL,
+            last_used REAL)""")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(results)")]
+        for column, kind in (('peak_rss', 'INTEGER'), ('cpu_time', 'REAL')):
+            if column not in columns:  # a cache written before the usage was recorded
+                self.conn.execute(f"ALTER TABLE results ADD COLUMN {column} {kind}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def key(self, kind, payload, context=''):
+        """
+            the cache key of one execution, context holds the sandbox settings that can change its result
+        """
+        digest = hashlib.sha256()
+        parts = (kind, self.fingerprint, payload) if not context else (kind, self.fingerprint, context, payload)
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key, timeout=None):
+        """
+            the cached record, None on a miss. a cached timeout is only reused
+            when the new timeout is not longer than the one that expired
+        """
+        row = self.conn.execute("SELECT verdict, error_class, stderr, duration, timeout, peak_rss, cpu_time "
+                                "FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        verdict, error, stderr, duration, cached_timeout, peak_rss, cpu_time = row
+        if verdict == 'timeout' and cached_timeout is not None and (timeout is None or timeout > cached_timeout):
+            return None
+        self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return {'verdict': verdict, 'error_class': error, 'stderr': stderr, 'duration': duration,
+                'usage': {'peak_rss': peak_rss, 'cpu_time': cpu_time}}
+
+    def put(self, key, verdict, error, stderr, duration, timeout=None, usage=None):
+        usage = usage or {}
+        self.conn.execute("INSERT OR REPLACE INTO results (key, fingerprint, verdict, error_class, stderr, duration, "
+                          "timeout, last_used, peak_rss, cpu_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (key, self.fingerprint, verdict, error, stderr, duration, timeout, time.time(),
+                           usage.get('peak_rss'), usage.get('cpu_time')))
+        self.conn.commit()
+        self.puts += 1
+        if self.puts % 1000 == 0:
+            self.evict()
+
+    def evict(self):
+        """
+            keep at most max_entries, dropping the least recently used ones
+        """
+        count = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute("DELETE FROM results WHERE key IN "
+                              "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+            self.conn.commit()
+
+    def invalidate(self):
+        """
+            drop the entries computed in a different environment, returns how many were dropped
+        """
+        dropped = self.conn.execute("DELETE FROM results WHERE fingerprint != ?", (self.fingerprint,)).rowcount
+        self.conn.commit()
+        return dropped
+
+    def clear(self):
+        self.conn.execute("DELETE FROM results")
+        self.conn.commit()
+
+    def timed(self, execute, context=''):
+        """
+            wrap a run_code style function to return (stderr, duration), a hit
+            returns the duration and usage of the original execution
+        """
+        def wrapped(code, timeout=None, usage=None):
+            key = self.key('run_code', code, context)
+            record = self.get(key, timeout)
+            if record is not None:
+                if usage is not None:
+                    usage.update(record['usage'])
+                return record['stderr'], record['duration']
+            start = time.monotonic()
+            usage = {} if usage is None else usage
+            errors = execute(code, usage=usage) if timeout is None else execute(code, timeout=timeout, usage=usage)
+            duration = time.monotonic() - start
+            if errors == "timeout error":
+                verdict = 'timeout'
+            elif is_failure(errors):
+                verdict = 'fail'
+            else:
+                verdict = 'pass'
+            self.put(key, verdict, error_class(errors), errors, duration, timeout, usage)
+            return errors, duration
+
+        return wrapped
+
+    def cached(self, execute, context=''):
+        """
+            wrap a run_code style function
+        """
+        timed_execute = self.timed(execute, context)
+
+        def wrapped(code, timeout=None, usage=None):
+            return timed_execute(code, timeout, usage)[0]
+
+        return wrapped
+
+    def cached_session(self, execute_session, context=''):
+        """
+            wrap a run_session style function
+        """
+        def wrapped(segments, timeout=None, usage=None):
+            key = self.key('run_session', json.dumps(segments), context)
+            return self.cached_records(key, execute_session, [segments], timeout, usage)
+
+        return wrapped
+
+    def cached_batch(self, execute_batch, context=''):
+        """
+            wrap a run_batch style function
+        """
+        def wrapped(code, cuts, timeout=None, usage=None):
+            key = self.key('run_batch', json.dumps([code, cuts]), context)
+            return self.cached_records(key, execute_batch, [code, cuts], timeout, usage)
+
+        return wrapped
+
+    def cached_records(self, key, execute, args, timeout, usage):
+        """
+            the per segment records of execute(*args), from the cache or by running it
+        """
+        record = self.get(key, timeout)
+        if record is not None:
+            if usage is not None:
+                usage.update(record['usage'])
+            return json.loads(record['stderr'])
+        start = time.monotonic()
+        usage = {} if usage is None else usage
+        if timeout is None:
+            records = execute(*args, usage=usage)
+        else:
+            records = execute(*args, timeout=timeout, usage=usage)
+        duration = time.monotonic() - start
+        errors = "".join(record['stderr'] for record in records)
+        if any(record['timed_out'] for record in records):
+            verdict = 'timeout'
+        elif is_failure(errors):
+            verdict = 'fail'
+        else:
+            verdict = 'pass'
+        self.put(key, verdict, error_class(errors), json.dumps(records), duration, timeout, usage)
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="inspect or clear the result cache")
+    parser.add_argument('path')
+    parser.add_argument('--clear', action='store_true', help="drop every entry")
+    parser.add_argument('--invalidate', action='store_true',
+                        help="drop the entries of every environment other than this one")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.path)
+    if args.clear:
+        cache.clear()
+    elif args.invalidate:
+        print(f"dropped {cache.invalidate()} entries of other environments")
+    rows = cache.conn.execute("SELECT verdict, COUNT(*), SUM(duration) FROM results GROUP BY verdict").fetchall()
+    print(f"fingerprint: {cache.fingerprint}")
+    for verdict, count, duration in rows:
+        print(f"{verdict}: {count} entries, {duration:.1f}s of execution")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# streaming writers of the per-assert results, one row per (model, task, assert)
+import glob
+import json
+import os
+
+from environment import environment_fingerprint
+from sandbox import error_class
+
+FIELDS = ['model', 'task_id', 'assert_index', 'assert_num', 'verdict', 'error_class', 'stderr', 'duration',
+          'peak_rss', 'cpu_time', 'outcome', 'fingerprint']
+STDERR_EXCERPT = 1000  # the tail of stderr holds the error, keep that much of it
+
+
+def assert_rows(model, task_id, records, fingerprint=None):
+    """
+        the rows of one (model, task) job, a task without asserts gets a single row with no verdict.
+        every row holds the fingerprint of the environment that ran the job, this one by default
+    """
+    fingerprint = fingerprint or environment_fingerprint()
+    if not records:
+        return [{'model': model, 'task_id': task_id, 'assert_index': None, 'assert_num': 0, 'verdict': None,
+                 'error_class': '', 'stderr': '', 'duration': 0.0, 'peak_rss': None,
+                 'cpu_time': None, 'outcome': None, 'fingerprint': fingerprint}]
+    rows = []
+    for index, record in enumerate(records):
+        if record['verdict'] == 'timeout':
+            error = "timeout error"
+        elif record['verdict'] == 'fail':
+            error = error_class(record['stderr'])
+        else:
+            error = ''
+        rows.append({
+            'model': model,
+            'task_id': task_id,
+            'assert_index': index,
+            'assert_num': len(records),
+            'verdict': record['verdict'],
+            'error_class': error,
+            'stderr': record['stderr'][-STDERR_EXCERPT:],
+            'duration': record['duration'],
+            'peak_rss': record.get('peak_rss'),
+            'cpu_time': record.get('cpu_time'),
+            'outcome': record.get('outcome'),
+            'fingerprint': fingerprint,
+        })
+    return rows
+
+
+def job_counts(rows):
+    """
+        the number of asserts and failed asserts of a job written to a sink
+    """
+    asserts = [row for row in rows if row['assert_index'] is not None]
+    return len(asserts), sum(row['verdict'] != 'pass' for row in asserts)
+
+
+def complete_jobs(rows, fingerprint=None):
+    """
+        group rows by (model, task_id), keeping the jobs with a row for every assert.
+        with a fingerprint, the rows computed in another environment are left out, so their jobs run again
+    """
+    jobs = {}
+    for row in rows:
+        if fingerprint and row.get('fingerprint') not in (None, fingerprint):  # rows from before fingerprints are kept
+            continue
+        key = (row['model'], row['task_id'])
+        if row['assert_index'] is None:
+            jobs[key] = {None: row}
+        else:
+            jobs.setdefault(key, {})[row['assert_index']] = row  # a re-run job overwrites its earlier rows
+    completed = {}
+    for key, indexed in jobs.items():
+        rows = [indexed[index] for index in sorted(indexed, key=lambda index: -1 if index is None else index)]
+        if None in indexed or len(indexed) == rows[0]['assert_num']:
+            completed[key] = rows
+    return completed
+
+
+class JsonlSink:
+    """
+        appends one json line per row, flushed and synced after every job
+    """
+
+    def __init__(self, path):
+        self.path = path
+        rows = []
+        if os.path.exists(path):
+            with open(path, 'rb+') as f:
+                data = f.read()
+                end = data.rfind(b'\n') + 1
+                if end != len(data):  # drop a line cut off by a crash
+                    f.truncate(end)
+            # only b'\n' ends a row, the stderr may hold the line separators str.splitlines knows as well
+            for line in data[:end].split(b'\n'):
+                if line.strip():
+                    rows.append(json.loads(line))
+        self.jobs = complete_jobs(rows, environment_fingerprint())  # (model, task_id) -> rows of the completed jobs
+        self.file = open(path, 'a', encoding='utf-8')  # the rows are read back as utf-8 whatever the locale
+
+    def write_job(self, rows):
+        self.file.write("".join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.jobs[(rows[0]['model'], rows[0]['task_id'])] = rows
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """
+        writes the rows in batches, every batch is a new part file in the directory.
+        a part is renamed into place only once it is complete, so a crash loses at most one batch
+    """
+
+    def __init__(self, directory, batch_size=1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("writing parquet results requires pyarrow, use a .jsonl file instead")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = directory
+        self.batch_size = batch_size
+        self.buffer = []
+        os.makedirs(directory, exist_ok=True)
+        self.parts = sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+        rows = []
+        for part in self.parts:
+            rows.extend(self.pq.read_table(part).to_pylist())
+        self.jobs = complete_jobs(rows, environment_fingerprint())
+
+    def write_job(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        part = os.path.join(self.directory, f'part-{len(self.parts):05d}.parquet')
+        table = self.pa.Table.from_pylist(self.buffer, schema=self.schema())
+        self.pq.write_table(table, part + '.tmp')
+        os.replace(part + '.tmp', part)
+        self.parts.append(part)
+        for key, job_rows in complete_jobs(self.buffer).items():
+            self.jobs[key] = job_rows
+        self.buffer = []
+
+    def schema(self):
+        pa = self.pa
+        return pa.schema([('model', pa.string()), ('task_id', pa.string()), ('assert_index', pa.int64()),
+                          ('assert_num', pa.int64()), ('verdict', pa.string()), ('error_class', pa.string()),
+                          ('stderr', pa.string()), ('duration', pa.float64()), ('peak_rss', pa.int64()),
+                          ('cpu_time', pa.float64()), ('outcome', pa.string()), ('fingerprint', pa.string())])
+
+    def close(self):
+        self.flush()
+
+
+def open_sink(path):
+    """
+        a ParquetSink for a path ending with .parquet, a JsonlSink otherwise
+    """
+    if path.endswith('.parquet'):
+        return ParquetSink(path)
+    return JsonlSink(path)
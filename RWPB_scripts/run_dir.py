@@ -0,0 +1,71 @@
+# a resumable evaluation run: manifest, per-assert results and one completion marker per job
+import json
+import os
+import time
+
+from environment import environment, environment_fingerprint
+from results_sink import JsonlSink
+
+
+def write_json_atomic(path, data):
+    """
+        write the json file under a temporary name and rename it into place
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class RunDirectory:
+    """
+        run_dir/manifest.json      the files and options of the run, checked on --resume
+        run_dir/results.jsonl      one row per assert, see results_sink.py
+        run_dir/done/*.json        one marker per finished (model, task) job with its counts
+    """
+
+    def __init__(self, path, config, resume=False):
+        self.path = path
+        self.done_dir = os.path.join(path, 'done')
+        manifest_path = os.path.join(path, 'manifest.json')
+        manifest = {'config': config, 'fingerprint': environment_fingerprint()}
+        if os.path.exists(manifest_path):
+            if not resume:
+                raise SystemExit(f"{path} already holds a run, pass --resume to continue it")
+            with open(manifest_path, 'r') as f:
+                stored = json.load(f)
+            for key in ('config', 'fingerprint'):
+                if stored[key] != manifest[key]:
+                    raise SystemExit(f"cannot resume {path}: the {key} differs from the one it was started with")
+        else:
+            os.makedirs(path, exist_ok=True)
+            manifest['created'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            manifest['environment'] = environment()  # what the fingerprint was computed from
+            write_json_atomic(manifest_path, manifest)
+        os.makedirs(self.done_dir, exist_ok=True)
+        self.sink = JsonlSink(os.path.join(path, 'results.jsonl'))
+
+    def marker(self, model, task_id):
+        return os.path.join(self.done_dir, f"{model}__{task_id.replace('/', '_')}.json")
+
+    def summary(self, model, task_id):
+        """
+            the counts of a finished job, None if it has not finished
+        """
+        try:
+            with open(self.marker(model, task_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def finish_job(self, rows, summary):
+        """
+            write the rows of a job, then mark it as finished
+        """
+        self.sink.write_job(rows)
+        write_json_atomic(self.marker(summary['model'], summary['task_id']), summary)
+
+    def close(self):
+        self.sink.close()
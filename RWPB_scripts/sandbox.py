@@ -0,0 +1,925 @@
+# execution backends for the extracted code
+import ast
+import builtins
+import functools
+import importlib
+import json
+import linecache
+import os
+import random
+import re
+import resource
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import types
+import warnings
+
+# the sandboxes run under the evaluator's own interpreter, the one environment.py fingerprints
+PYTHON = sys.executable or 'python'
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# the variables sizing the thread pools of OpenMP, MKL, OpenBLAS, numexpr and Accelerate
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS']
+
+# the phases of a profiled execution, see _exec_profiled
+PHASES = ['startup', 'import', 'definition', 'setup', 'asserts']
+# a profiled child writes this line to stderr after the script, followed by its phases as json
+PHASES_MARKER = '\0__rwpb_phases__ '
+
+# the runner of run_code_pipe, passed with -c so that an execution only pays for the startup of the
+# interpreter and not for compiling and importing this module. the code is read from stdin and runs
+# as the __main__ module "<sandbox>". an error is printed by the builtin sys.excepthook like the one of
+# a script, without importing traceback, and as "<sandbox>" is no file its tracebacks have no source lines
+PIPE_RUNNER = """
+import os, sys
+code = sys.stdin.buffer.read().decode('utf-8')
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+if sys.path and sys.path[0] == '':  # the working directory, which a script does not see either
+    del sys.path[0]
+sys.argv = ['<sandbox>']
+main = type(sys)('__main__')
+main.__file__ = '<sandbox>'
+main.__builtins__ = __builtins__
+sys.modules['__main__'] = main
+try:
+    exec(compile(code, '<sandbox>', 'exec'), main.__dict__)
+except SystemExit:
+    raise
+except BaseException as e:
+    e.__traceback__ = e.__traceback__.tb_next  # hide the runner frame
+    sys.excepthook(type(e), e, e.__traceback__)
+    sys.exit(1)
+"""
+
+
+def run_code(code, timeout=60, usage=None, limits=None, profile=False):
+    """
+        execute the extracted code.
+        usage, if given, is filled with the peak RSS and CPU time of the execution,
+        limits is a dict of rlimits for the child, see apply_limits.
+        with profile, usage also gets the seconds of every phase of the script, see _exec_profiled.
+        the file is then run by `sandbox.py --exec`, whose own imports count as startup
+    """
+    with tempfile.NamedTemporaryFile(delete=False, mode='w') as temp_file:
+        temp_file.write(code)
+        temp_file_path = temp_file.name
+    if True:
+        read_fd, write_fd = os.pipe()
+        command = [PYTHON, temp_file_path]
+        if profile:
+            command = [PYTHON, os.path.abspath(__file__), "--exec", "--profile", repr(time.time()), temp_file_path]
+        proc = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=write_fd,
+                                start_new_session=True, preexec_fn=_limiter(limits))
+        os.close(write_fd)
+        stderr, timed_out, status, rusage = _collect(proc.pid, read_fd, timeout)
+        proc.returncode = status
+        stderr, phases = _take_phases(stderr)
+        errors = _errors(stderr, timed_out, status, limits)
+
+        os.remove(temp_file_path)
+
+    _record_usage(usage, rusage, phases)
+    return errors
+
+
+def run_code_pipe(code, timeout=60, usage=None, limits=None, profile=False):
+    """
+        execute the extracted code, passed to the interpreter over a pipe instead of a
+        temporary file. tracebacks refer to the file "<sandbox>" with the usual line numbers,
+        see PIPE_RUNNER. a profiled execution is run by `sandbox.py --exec` instead of PIPE_RUNNER, see run_code
+    """
+    read_fd, write_fd = os.pipe()
+    command = [PYTHON, "-c", PIPE_RUNNER]
+    if profile:
+        command = [PYTHON, os.path.abspath(__file__), "--exec", "--profile", repr(time.time())]
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, stderr=write_fd, start_new_session=True,
+                            preexec_fn=_limiter(limits))
+    os.close(write_fd)
+    try:
+        proc.stdin.write(code.encode('utf-8'))
+        proc.stdin.close()
+    except BrokenPipeError:  # the child died before reading its code
+        pass
+    stderr, timed_out, status, rusage = _collect(proc.pid, read_fd, timeout)
+    proc.returncode = status
+    stderr, phases = _take_phases(stderr)
+    errors = _errors(stderr, timed_out, status, limits)
+
+    _record_usage(usage, rusage, phases)
+    return errors
+
+
+async def run_code_async(code, timeout=60, limits=None):
+    """
+        run_code_pipe as a coroutine, so that many sandboxes can be awaited from one thread.
+        the verdict rules are those of run_code, the usage is not measured
+    """
+    import asyncio  # not at the top, every profiled sandbox started with --exec would pay for importing it
+
+    proc = await asyncio.create_subprocess_exec(PYTHON, "-c", PIPE_RUNNER,
+                                                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                                stderr=subprocess.PIPE, start_new_session=True,
+                                                preexec_fn=_limiter(limits))
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(code.encode('utf-8')), timeout)
+    except asyncio.TimeoutError:
+        _kill_group(proc.pid)
+        await proc.wait()
+        return _errors("", True, None, limits)
+    return _errors(stderr.decode(errors="replace"), False, proc.returncode, limits)
+
+
+def apply_limits(limits):
+    """
+        set the rlimits of the current process. limits may hold address_space (bytes),
+        cpu_seconds and open_files, a missing or empty entry leaves that limit alone
+    """
+    if not limits:
+        return
+    if limits.get('address_space'):
+        resource.setrlimit(resource.RLIMIT_AS, (limits['address_space'], limits['address_space']))
+    if limits.get('cpu_seconds'):
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu_seconds'], limits['cpu_seconds'] + 1))
+    if limits.get('open_files'):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limits['open_files'], limits['open_files']))
+
+
+def _limiter(limits):
+    """
+        the preexec_fn applying the limits in a child, None without limits
+    """
+    if not limits:
+        return None
+    return functools.partial(apply_limits, limits)
+
+
+def _record_usage(usage, rusage, phases=None):
+    """
+        fill the usage dict of the caller from the rusage of a reaped child and the phases it profiled
+    """
+    if usage is None:
+        return
+    if phases is not None:
+        usage['phases'] = phases
+    if rusage is None:
+        return
+    usage['peak_rss'] = rusage.ru_maxrss * MAXRSS_UNIT
+    usage['cpu_time'] = rusage.ru_utime + rusage.ru_stime
+
+
+def _take_phases(stderr):
+    """
+        split the line of PHASES_MARKER off the stderr of a profiled child, return (stderr, phases).
+        phases is None when the child was not profiled or did not get to the end of the script
+    """
+    start = stderr.rfind(PHASES_MARKER)
+    if start < 0:
+        return stderr, None
+    line, _, rest = stderr[start + len(PHASES_MARKER):].partition('\n')
+    try:
+        phases = json.loads(line)
+    except ValueError:  # cut off by a kill
+        phases = None
+    return stderr[:start] + rest, phases
+
+
+def _errors(stderr, timed_out, status, limits):
+    """
+        the verdict string of run_code: "timeout error", "function_error" or the stderr.
+        with limits, a child killed by a signal fails even though it wrote nothing
+    """
+    if timed_out:
+        return "timeout error"
+    errors = stderr + _signal_message(status, limits)
+    if "AssertionError" in errors:
+        errors = "function_error"
+    return errors
+
+
+def _signal_message(status, limits):
+    """
+        the error of a child killed by a signal while running under rlimits
+    """
+    if not limits or status is None or status >= 0:
+        return ""
+    try:
+        name = signal.Signals(-status).name
+    except ValueError:
+        name = f"signal {-status}"
+    return f"\nkilled by {name}, a resource limit was exceeded\n"
+
+
+def available_cores():
+    """
+        the number of cores this process may run on
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers, cores=None):
+    """
+        split the core budget evenly over the workers, at least one thread each
+    """
+    return max(1, (cores or available_cores()) // max(1, workers))
+
+
+def limit_threads(threads):
+    """
+        cap the numeric libraries of this process and of every sandbox it starts to the
+        given number of threads. the variables are read when a library is loaded, so call
+        this before starting a fork server or importing torch
+    """
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+    _set_torch_threads()
+
+
+def _set_torch_threads():
+    """
+        apply OMP_NUM_THREADS to an already imported torch
+    """
+    threads = os.environ.get('OMP_NUM_THREADS')
+    torch = sys.modules.get('torch')
+    if threads and torch is not None and hasattr(torch, 'set_num_threads'):
+        torch.set_num_threads(int(threads))
+
+
+def timed(execute):
+    """
+        wrap a run_code style function to also return the wall time of the execution
+    """
+    def wrapped(code, timeout=None, **kwargs):
+        start = time.monotonic()
+        errors = execute(code, **kwargs) if timeout is None else execute(code, timeout=timeout, **kwargs)
+        return errors, time.monotonic() - start
+
+    return wrapped
+
+
+class ForkServer:
+    """
+        a pre-warmed parent that keeps the heavy libraries imported and forks
+        one isolated child per execution
+    """
+
+    def __init__(self, preload=(), timeout=60):
+        self.preload = list(preload)
+        self.timeout = timeout
+        self.proc = None
+
+    def start(self):
+        self.proc = subprocess.Popen([PYTHON, os.path.abspath(__file__), "--serve"] + self.preload,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        ready = self.proc.stdout.readline()
+        if ready.strip() != "ready":
+            raise RuntimeError("fork server failed to start")
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, message):
+        """
+            send one request to the server and wait for its response
+        """
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        self.proc.stdin.write(json.dumps(message) + '\n')
+        self.proc.stdin.flush()
+        response = self.proc.stdout.readline()
+        if not response:  # the server itself died, restart it for the next request
+            self.proc = None
+            raise RuntimeError("fork server exited unexpectedly")
+        return json.loads(response)
+
+    def run_code(self, code, timeout=None, usage=None, limits=None, profile=False):
+        """
+            execute the extracted code in a forked child, same verdicts as run_code.
+            the address space limit also counts the preloaded libraries
+        """
+        response = self.request({"code": code, "timeout": timeout or self.timeout, "limits": limits,
+                                 "profile": time.time() if profile else None})
+        if usage is not None and response["usage"] is not None:
+            usage.update(response["usage"])
+        stderr, phases = _take_phases(response["stderr"])
+        _record_usage(usage, None, phases)
+        return _errors(stderr, response["timed_out"], response["status"], limits)
+
+    def run_session(self, segments, timeout=None, usage=None, limits=None, profile=False):
+        """
+            execute the segments one after another in a single forked child, see run_session
+        """
+        response = self.request({"segments": segments, "timeout": timeout or self.timeout, "limits": limits,
+                                 "profile": time.time() if profile else None})
+        if usage is not None and response["usage"] is not None:
+            usage.update(response["usage"])
+        return response["segments"]
+
+    def run_batch(self, code, cuts, timeout=None, usage=None, limits=None, profile=False):
+        """
+            execute the complete test script in a single forked child, see run_batch
+        """
+        response = self.request({"batch": code, "cuts": cuts, "timeout": timeout or self.timeout, "limits": limits,
+                                 "profile": time.time() if profile else None})
+        if usage is not None and response["usage"] is not None:
+            usage.update(response["usage"])
+        return response["segments"]
+
+
+def run_session(segments, timeout=60, usage=None, limits=None, profile=False):
+    """
+        execute the segments one after another in a single fresh interpreter.
+        segments is a list of [source, line_offset], all of them share one namespace
+        and the execution stops at the first segment that writes to stderr.
+        returns one {"stderr", "timed_out", "duration", "peak_rss", "cpu_time"} record per
+        segment that was started, the peak RSS is the high-water mark of the process so far.
+        with profile, the records of the finished segments also hold their "phases", the
+        startup counting in the first one. the timeout covers the whole run like the timeout of run_code
+    """
+    return _run_job({"segments": segments}, len(segments), timeout, usage, limits, profile)
+
+
+def run_batch(code, cuts, timeout=60, usage=None, limits=None, profile=False):
+    """
+        execute the complete test script once in a fresh interpreter. cuts are the line numbers
+        of the asserts, the top level statement ending at each of them is wrapped so that its
+        exception is printed like an uncaught one and the script goes on with the next assert.
+        returns one record per assert like run_session, plus the "outcome" of the wrapped
+        statement: "pass" or the name of its exception
+    """
+    return _run_job({"batch": code, "cuts": cuts}, len(cuts), timeout, usage, limits, profile)
+
+
+def _run_job(job, count, timeout, usage, limits, profile=False):
+    """
+        run a session or batch job in a fresh interpreter, see run_session
+    """
+    with _stderr_file() as stderr_file:
+        if profile:
+            job = dict(job, profile=time.time())
+        proc = subprocess.Popen([PYTHON, os.path.abspath(__file__), "--session"],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr_file,
+                                start_new_session=True, preexec_fn=_limiter(limits))
+        try:
+            proc.stdin.write(json.dumps(job).encode())
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        results, timed_out = _collect_session(proc.stdout.fileno(), count, timeout,
+                                              functools.partial(_kill_group, proc.pid))
+        proc.stdout.close()
+        _, status, rusage = _reap(proc.pid)
+        proc.returncode = status
+        _record_usage(usage, rusage)
+        return _split_stderr(stderr_file, results, count, timed_out, _signal_message(status, limits))
+
+
+def _stderr_file():
+    """
+        an anonymous in-memory file for the stderr of a session, a temporary file where memfd is missing
+    """
+    if hasattr(os, 'memfd_create'):
+        return os.fdopen(os.memfd_create("stderr"), 'w+b')
+    return tempfile.TemporaryFile()
+
+
+def _prepare_main(code, filename):
+    """
+        make the child look like `python filename`, return the __main__ namespace
+    """
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+    sys.argv = [filename]
+    random.seed()
+    main_module = types.ModuleType('__main__')
+    main_module.__file__ = filename
+    main_module.__builtins__ = builtins
+    sys.modules['__main__'] = main_module
+    return main_module.__dict__
+
+
+def _exec_main(code, filename, namespace, profiler=None):
+    """
+        execute the code the way the interpreter runs a script, return (exit status, stopped).
+        with a profiler the statements are timed one at a time, see _exec_profiled
+    """
+    status = 0
+    stopped = False
+    try:
+        if profiler is not None:
+            _exec_profiled(code, filename, namespace, profiler)
+        else:
+            if not isinstance(code, types.CodeType):
+                code = compile(code, filename, 'exec')
+            exec(code, namespace)
+    except SystemExit as e:
+        stopped = True
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        stopped = True
+        exc_type, exc, tb = sys.exc_info()
+        while tb is not None and tb.tb_frame.f_code.co_filename == _exec_main.__code__.co_filename:
+            tb = tb.tb_next  # hide the sandbox frames
+        traceback.print_exception(exc_type, exc, tb)
+        status = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        pass
+    return status, stopped
+
+
+def _profiler(launched):
+    """
+        the phase times of a profiled execution, the startup is the time since the parent launched it
+    """
+    phases = dict.fromkeys(PHASES, 0.0)
+    phases['startup'] = max(0.0, time.time() - launched)
+    return {"phases": phases, "imports": {}, "defined": False}
+
+
+def _take_profile(profiler):
+    """
+        the phases timed since the last call, with the seconds of every imported module
+    """
+    phases = dict(profiler["phases"], imports=profiler["imports"])
+    profiler.update(phases=dict.fromkeys(PHASES, 0.0), imports={})
+    return phases
+
+
+def _statement_phase(node, defined):
+    """
+        the phase of a top level statement: an import, an assert (wrapped by _batch_tree in a
+        batch job), part of the definition until the canonical solution is defined, or test setup
+    """
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return 'import'
+    if isinstance(node, ast.Try) and node.body:
+        node = node.body[0]
+    if isinstance(node, ast.Assert) or (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+                                        and getattr(node.value.func, 'id', None) == '__rwpb_checkpoint__'):
+        return 'asserts'
+    return 'setup' if defined else 'definition'
+
+
+def _exec_profiled(code, filename, namespace, profiler):
+    """
+        execute a script or module tree one top level statement at a time, adding the time of each
+        to its phase and the time of an import to its modules. the definition ends with the def of
+        SOLUTION_SIGNATURE, the canonical solution of build_test_script. imports inside functions
+        count in the phase of the statement calling them
+    """
+    if not isinstance(code, ast.Module):
+        compile(code, filename, 'exec')  # the errors and warnings of the whole script, as without profiling
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            code = ast.parse(code, filename)
+    for node in code.body:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            statement = compile(ast.Module([node], []), filename, 'exec')
+        phase = _statement_phase(node, profiler["defined"])
+        start = time.perf_counter()
+        try:
+            exec(statement, namespace)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler["phases"][phase] += elapsed
+            if phase == 'import':
+                module = node.names[0].name if isinstance(node, ast.Import) else node.module or '.'
+                module = module.split('.')[0]
+                profiler["imports"][module] = profiler["imports"].get(module, 0.0) + elapsed
+            if isinstance(node, ast.FunctionDef) and node.name == 'SOLUTION_SIGNATURE':
+                profiler["defined"] = True
+
+
+def _write_phases(profiler):
+    """
+        send the phases of a profiled execution to the parent after the stderr of the script
+    """
+    if profiler is not None:
+        os.write(2, (PHASES_MARKER + json.dumps(_take_profile(profiler)) + '\n').encode())
+
+
+def _exec_child(code, filename, launched=None):
+    """
+        run the code as the __main__ module of a freshly forked child and exit,
+        profiled when the time it was launched is given
+    """
+    profiler = _profiler(launched) if launched is not None else None
+    namespace = _prepare_main(code, filename)
+    status, _ = _exec_main(code, filename, namespace, profiler)
+    _write_phases(profiler)
+    os._exit(status)
+
+
+def _exec_segments(segments, filename, result_fd, profiler=None):
+    """
+        run the segments in one __main__ namespace, stderr (fd 2) must be a regular file.
+        after each segment one json line with the stderr offset is written to result_fd
+    """
+    namespace = _prepare_main("".join(source for source, _ in segments), filename)
+    status = 0
+    for source, offset in segments:
+        start = time.monotonic()
+        cpu_start = time.process_time()
+        # pad with newlines so that line numbers match the complete script
+        status, stopped = _exec_main("\n" * offset + source, filename, namespace, profiler)
+        result = {
+            "duration": time.monotonic() - start,
+            "cpu_time": time.process_time() - cpu_start,
+            "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT,
+            "stopped": stopped,
+        }
+        if profiler is not None:
+            result["phases"] = _take_profile(profiler)
+        result["end"] = os.lseek(2, 0, os.SEEK_END)
+        failed = is_failure(os.pread(2, result["end"], 0).decode(errors="replace"))
+        os.write(result_fd, (json.dumps(result) + '\n').encode())
+        if stopped or failed:
+            break
+    os._exit(status)
+
+
+def _batch_tree(code, cuts, filename):
+    """
+        the module of a batch job: the statement ending at each cut line is wrapped in
+        try: ... except Exception as __rwpb_error__: __rwpb_fault__(__rwpb_error__)
+        and followed by __rwpb_checkpoint__(). the nodes keep their original positions
+    """
+    tree = ast.parse(code, filename)
+    nodes = tree.body
+    body = []
+    index = 0
+    for position, node in enumerate(nodes):
+        following = nodes[position + 1].lineno if position + 1 < len(nodes) else float('inf')
+        if index < len(cuts) and node.end_lineno <= cuts[index] < following:
+            handler = ast.ExceptHandler(type=ast.Name('Exception', ast.Load()), name='__rwpb_error__', body=[
+                ast.Expr(ast.Call(ast.Name('__rwpb_fault__', ast.Load()), [ast.Name('__rwpb_error__', ast.Load())], []))
+            ])
+            body.append(ast.copy_location(ast.Try(body=[node], handlers=[handler], orelse=[], finalbody=[]), node))
+            while index < len(cuts) and cuts[index] < following:
+                body.append(ast.copy_location(ast.Expr(ast.Call(ast.Name('__rwpb_checkpoint__', ast.Load()), [], [])),
+                                              node))
+                index += 1
+        else:
+            body.append(node)
+    tree.body = body
+    return ast.fix_missing_locations(tree)
+
+
+def _exec_batch(code, cuts, filename, result_fd, profiler=None):
+    """
+        run a batch job in the __main__ namespace, stderr (fd 2) must be a regular file.
+        every checkpoint writes the json line of its assert to result_fd, and the assert
+        that was running when the script stopped gets one too
+    """
+    namespace = _prepare_main(code, filename)
+    # the whole script is compiled up front, but a compile time warning must land in
+    # the stderr of the assert it belongs to, as it does when the prefixes are run
+    compiled = code
+    pending = [[] for _ in cuts]
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            tree = _batch_tree(code, cuts, filename)
+            compiled = compile(tree, filename, 'exec')
+        if profiler is not None:  # run statement by statement, the warnings were caught above
+            compiled = tree
+        for warning in caught:
+            index = next((index for index, cut in enumerate(cuts) if warning.lineno <= cut), len(cuts) - 1)
+            pending[index].append(warning)
+    except SyntaxError:
+        pass  # reported by _exec_main like any script that does not compile
+
+    def warn(index):
+        for warning in pending[index] if index < len(pending) else []:
+            warnings.showwarning(warning.message, warning.category, warning.filename, warning.lineno)
+
+    state = {"index": 0, "outcome": "pass", "start": time.monotonic(), "cpu_start": time.process_time()}
+
+    def report(stopped):
+        result = {
+            "duration": time.monotonic() - state["start"],
+            "cpu_time": time.process_time() - state["cpu_start"],
+            "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT,
+            "stopped": stopped,
+            "outcome": None if stopped else state["outcome"],
+        }
+        if profiler is not None:
+            result["phases"] = _take_profile(profiler)
+        try:
+            sys.stderr.flush()
+        except Exception:
+            pass
+        result["end"] = os.lseek(2, 0, os.SEEK_END)
+        os.write(result_fd, (json.dumps(result) + '\n').encode())
+        state.update(index=state["index"] + 1, outcome="pass", start=time.monotonic(),
+                     cpu_start=time.process_time())
+        warn(state["index"])
+
+    def fault(error):
+        traceback.print_exception(type(error), error, error.__traceback__)
+        state["outcome"] = type(error).__name__
+
+    namespace['__rwpb_checkpoint__'] = functools.partial(report, False)
+    namespace['__rwpb_fault__'] = fault
+    warn(0)
+    status, stopped = _exec_main(compiled, filename, namespace, profiler)
+    if state["index"] < len(cuts):
+        report(True)
+    os._exit(status)
+
+
+def _collect_session(read_fd, count, timeout, kill):
+    """
+        read the per segment result lines, kill the child once the timeout expires
+    """
+    deadline = time.monotonic() + timeout
+    results = []
+    buffer = b""
+    timed_out = False
+    while len(results) < count:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            kill()
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        data = os.read(read_fd, 65536)
+        if not data:
+            break
+        buffer += data
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            results.append(json.loads(line))
+    return results, timed_out
+
+
+def _split_stderr(stderr_file, results, count, timed_out, killed=""):
+    """
+        cut the stderr of a session into one record per started segment,
+        killed is the message for a child that died from a signal under rlimits
+    """
+    stderr_file.seek(0)
+    errors = stderr_file.read()
+    records = []
+    start = 0
+    for result in results:
+        records.append({"stderr": errors[start:result["end"]].decode(errors="replace"), "timed_out": False,
+                        "duration": result["duration"], "peak_rss": result["peak_rss"],
+                        "cpu_time": result["cpu_time"]})
+        if "outcome" in result:
+            records[-1]["outcome"] = result["outcome"]
+        if "phases" in result:
+            records[-1]["phases"] = result["phases"]
+        start = result["end"]
+    if timed_out:
+        records.append({"stderr": errors[start:].decode(errors="replace"), "timed_out": True})
+    elif len(results) < count and not (results and results[-1]["stopped"]) \
+            and not is_failure("".join(record["stderr"] for record in records)):
+        # the child died inside a segment without reporting it
+        records.append({"stderr": errors[start:].decode(errors="replace") + killed, "timed_out": False})
+    return records
+
+
+def is_failure(errors):
+    """
+        whether the stderr of an execution fails the assert
+    """
+    errors = errors.replace("\n", "")
+    errors = errors.replace("\b", "")
+    errors = errors.strip()
+    return errors != ""
+
+
+def error_class(errors):
+    """
+        the class of the error reported on stderr, "" if there is none
+    """
+    if not is_failure(errors):
+        return ""
+    if errors in ("function_error", "timeout error"):
+        return errors
+    for line in reversed(errors.strip().splitlines()):
+        match = re.match(r"([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))\b", line)
+        if match:
+            return match.group(1).split('.')[-1]
+    return "stderr_output"
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _reap(pid, deadline=None):
+    """
+        wait for the child until the deadline, return (finished, exit status, rusage)
+    """
+    while True:
+        finished, status, rusage = os.wait4(pid, 0 if deadline is None else os.WNOHANG)
+        if finished:
+            return True, os.waitstatus_to_exitcode(status), rusage
+        if time.monotonic() >= deadline:
+            return False, None, None
+        time.sleep(0.001)
+
+
+def _collect(pid, read_fd, timeout):
+    """
+        read the child's stderr until it exits, killing its process group once the timeout expires.
+        returns (stderr, timed_out, exit status, rusage)
+    """
+    deadline = time.monotonic() + timeout
+    chunks = []
+    timed_out = False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        data = os.read(read_fd, 65536)
+        if not data:
+            break
+        chunks.append(data)
+    status = None
+    rusage = None
+    if not timed_out:
+        finished, status, rusage = _reap(pid, deadline)
+        timed_out = not finished
+    os.close(read_fd)
+    if timed_out:
+        _kill_group(pid)
+        _, status, rusage = _reap(pid)
+    return b"".join(chunks).decode(errors="replace"), timed_out, status, rusage
+
+
+def _fork_exec(code, timeout, limits=None, launched=None):
+    """
+        fork an isolated child to execute the code and report its stderr, profiled when the
+        time the request was sent is given
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.setsid()  # own process group, so a timeout also kills its descendants
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        os.dup2(devnull, 1)
+        os.dup2(write_fd, 2)
+        apply_limits(limits)
+        _exec_child(code, "<sandbox>", launched)
+    os.close(write_fd)
+    stderr, timed_out, status, rusage = _collect(pid, read_fd, timeout)
+    usage = {}
+    _record_usage(usage, rusage)
+    return {"stderr": stderr, "timed_out": timed_out, "status": status, "usage": usage}
+
+
+def _fork_job(job, count, timeout, limits=None):
+    """
+        fork an isolated child to execute the segments of a session or a batch job
+    """
+    with _stderr_file() as stderr_file:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            os.dup2(devnull, 0)
+            os.dup2(devnull, 1)
+            os.dup2(stderr_file.fileno(), 2)
+            apply_limits(limits)
+            _exec_job(job, "<sandbox>", write_fd)
+        os.close(write_fd)
+
+        results, timed_out = _collect_session(read_fd, count, timeout, functools.partial(_kill_group, pid))
+        os.close(read_fd)
+        _, status, rusage = _reap(pid)
+        usage = {}
+        _record_usage(usage, rusage)
+        segments = _split_stderr(stderr_file, results, count, timed_out, _signal_message(status, limits))
+        return {"segments": segments, "usage": usage}
+
+
+def _exec_job(job, filename, result_fd):
+    """
+        run a session or batch job in this process and exit, profiled when the job holds
+        the time it was launched
+    """
+    profiler = _profiler(job["profile"]) if job.get("profile") is not None else None
+    if "batch" in job:
+        _exec_batch(job["batch"], job["cuts"], filename, result_fd, profiler)
+    _exec_segments(job["segments"], filename, result_fd, profiler)
+
+
+def exec_main(args):
+    """
+        entry point of the profiled run_code and run_code_pipe, args start with --profile and
+        the time of the launch, then the file of run_code or nothing for code read from stdin
+    """
+    launched = None
+    if args[:1] == ["--profile"]:
+        launched = float(args[1])
+        args = args[2:]
+    filename = "<sandbox>"
+    if args:
+        filename = args[0]
+        sys.path[0] = os.path.dirname(os.path.abspath(filename))  # as for `python filename`
+        with open(filename, 'r', encoding='utf-8') as f:
+            code = f.read()
+    else:
+        code = sys.stdin.buffer.read().decode('utf-8')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    profiler = _profiler(launched) if launched is not None else None
+    namespace = _prepare_main(code, filename)
+    status, _ = _exec_main(code, filename, namespace, profiler)
+    _write_phases(profiler)
+    sys.exit(status)
+
+
+def session_main():
+    """
+        entry point of run_session and run_batch, the job is read from stdin and results go to stdout
+    """
+    job = json.loads(sys.stdin.read())
+    result_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    _exec_job(job, "<sandbox>", result_fd)
+
+
+def serve(preload):
+    """
+        the fork server loop, one json request per line on stdin
+    """
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:  # the children will report the import error themselves
+            pass
+    _set_torch_threads()  # inherited by every forked child
+    out = sys.stdout
+    out.write("ready\n")
+    out.flush()
+    for line in sys.stdin:
+        request = json.loads(line)
+        if "segments" in request:
+            job = {"segments": request["segments"], "profile": request.get("profile")}
+            response = _fork_job(job, len(job["segments"]), request["timeout"], request.get("limits"))
+        elif "batch" in request:
+            job = {"batch": request["batch"], "cuts": request["cuts"], "profile": request.get("profile")}
+            response = _fork_job(job, len(job["cuts"]), request["timeout"], request.get("limits"))
+        else:
+            response = _fork_exec(request["code"], request["timeout"], request.get("limits"), request.get("profile"))
+        out.write(json.dumps(response) + '\n')
+        out.flush()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--session":
+        session_main()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--exec":
+        exec_main(sys.argv[2:])
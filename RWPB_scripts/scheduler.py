@@ -0,0 +1,389 @@
+# evaluate every model in LLMGeneratedCode on RWPB with a pool of worker processes
+import argparse
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from evaluate import run_asserts, run_asserts_incremental, run_asserts_batch, count_wrong, adaptive_timeout, model_name, resource_limits, \
+    executors, task_libraries, tolerant_item, tolerances, job_phases, print_phases
+from results_sink import open_sink, assert_rows, job_counts
+from run_dir import RunDirectory
+from loader import iter_records
+from sandbox import ForkServer, limit_threads, threads_per_worker, available_cores
+from result_cache import ResultCache
+from normalize import solution_fingerprint
+from environment import environment_fingerprint
+
+server = None  # the fork server of this worker process
+cache = None  # the result cache of this worker process
+executor_kind = 'subprocess'  # the execution backend of this worker process
+
+
+def init_worker(executor, preload, cache_path=None, cache_size=200000, threads=None):
+    """
+        start the per worker execution backend, the sandboxes of the worker use at most `threads` threads
+    """
+    global server, cache, executor_kind
+    executor_kind = executor
+    if threads:
+        limit_threads(threads)
+    if executor == 'forkserver':
+        server = ForkServer(preload=preload)
+        server.start()
+    if cache_path:
+        cache = ResultCache(cache_path, max_entries=cache_size)
+
+
+def job_verdict(assert_num, wrong_num):
+    """
+        pass, partial_wrong or wrong, as counted by evaluate.py
+    """
+    if wrong_num == 0:
+        return 'pass'
+    if wrong_num != assert_num:
+        return 'partial_wrong'
+    return 'wrong'
+
+
+def run_job(model, item, options):
+    """
+        evaluate one (model, task) job, every execution is cut to the time left for the job
+    """
+    start = time.monotonic()
+    deadline = start + options['job_timeout']
+    if options['tolerance']:
+        item = tolerant_item(item, *options['tolerance'])
+    execute_code, execute_segments, execute_script, measure = executors(executor_kind, server, options['limits'], cache,
+                                                                        options['profile'])
+
+    def execute(code, timeout=None, **kwargs):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return "timeout error"
+        return execute_code(code, timeout=min(timeout or options['timeout'], remaining), **kwargs)
+
+    def execute_session(segments, timeout=None, **kwargs):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return [{"stderr": "", "timed_out": True}]
+        return execute_segments(segments, timeout=min(timeout or options['timeout'], remaining), **kwargs)
+
+    def execute_batch(code, cuts, timeout=None, **kwargs):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return [{"stderr": "", "timed_out": True}]
+        return execute_script(code, cuts, timeout=min(timeout or options['timeout'], remaining), **kwargs)
+
+    timeout = options['timeout']
+    if options['adaptive_timeout']:
+        timeout = adaptive_timeout(item, measure, options['timeout_multiplier'], options['timeout_floor'], timeout)
+
+    if options['mode'] == 'incremental':
+        records = run_asserts_incremental(item, execute_session, execute, timeout)
+    elif options['mode'] == 'batch':
+        records = run_asserts_batch(item, execute_batch, execute, timeout)
+    else:
+        records = run_asserts(item, execute, timeout)
+    assert_num, wrong_num = count_wrong(records)
+
+    duration = time.monotonic() - start
+    row = {
+        'model': model,
+        'task_id': item['task_id'],
+        'assert_num': assert_num,
+        'wrong_num': wrong_num,
+        'verdict': job_verdict(assert_num, wrong_num),
+        'duration': round(duration, 3),
+        'job_timeout': duration >= options['job_timeout'],
+        'fingerprint': environment_fingerprint(),
+        'asserts': records,
+    }
+    if options['profile']:
+        row['phases'] = job_phases(records)
+    return row
+
+
+def iter_jobs(file_names):
+    """
+        yield (order, model, item) for every task of every model file
+    """
+    for file_index, file_name in enumerate(file_names):
+        model = model_name(file_name)
+        for item_index, item in enumerate(iter_records(file_name)):
+            yield (file_index, item_index), model, item
+
+
+def routed_jobs(file_names):
+    """
+        the jobs of iter_jobs ordered by the libraries they import, so that each library
+        group is evaluated in one stretch and its pool can be shut down afterwards
+    """
+    jobs = [(task_libraries(item), order, model, item) for order, model, item in iter_jobs(file_names)]
+    jobs.sort(key=lambda job: (job[0], job[1]))
+    for group, order, model, item in jobs:
+        yield order, model, item
+
+
+DEFAULT_OPTIONS = {
+    'mode': 'cumulative',
+    'timeout': 60,
+    'job_timeout': 600,
+    'adaptive_timeout': False,
+    'timeout_multiplier': 10,
+    'timeout_floor': 5,
+    'limits': None,
+    'tolerance': None,
+    'profile': False,
+}
+
+
+def completed_row(model, task_id, job_rows):
+    """
+        the table row of a job completed in an earlier run, from its rows in the sink
+    """
+    assert_num, wrong_num = job_counts(job_rows)
+    return {
+        'model': model,
+        'task_id': task_id,
+        'assert_num': assert_num,
+        'wrong_num': wrong_num,
+        'verdict': job_verdict(assert_num, wrong_num),
+        'duration': round(sum(row['duration'] or 0.0 for row in job_rows), 3),
+        'job_timeout': False,
+        'fingerprint': job_rows[0].get('fingerprint'),
+    }
+
+
+def copied_row(row, model):
+    """
+        the table row of a job whose result is copied from an equivalent job, without the phases it did not spend
+    """
+    row = dict(row, model=model)
+    row.pop('phases', None)
+    return row
+
+
+def finished_row(model, task_id, sink, run):
+    """
+        the table row of a job finished by an earlier run, None if it still has to run
+    """
+    if run is not None:
+        summary = run.summary(model, task_id)
+        if summary is None:
+            return None
+        return {
+            'model': model,
+            'task_id': task_id,
+            'assert_num': summary['assert_num'],
+            'wrong_num': summary['wrong_num'],
+            'verdict': job_verdict(summary['assert_num'], summary['wrong_num']),
+            'duration': round(summary.get('duration', 0.0), 3),
+            'job_timeout': summary.get('job_timeout', False),
+            'fingerprint': summary.get('fingerprint'),
+        }
+    if sink is not None and (model, task_id) in sink.jobs:
+        return completed_row(model, task_id, sink.jobs[(model, task_id)])
+    return None
+
+
+def schedule(file_names, workers, executor='subprocess', preload=(), cache_path=None, cache_size=200000,
+             sink=None, run=None, cores=None, route_imports=False, normalize=False, **options):
+    """
+        fan the (model, task) jobs out over the pool, at most `workers` jobs run at once.
+        the budget of `cores` is split evenly over the workers to size the thread pools
+        of torch and numpy in the sandboxes, 0 leaves them at the library defaults.
+        with route_imports and the fork server, the jobs are grouped by the libraries found by
+        import_scan.py and each group runs in its own pool preloading exactly those libraries.
+        with normalize, the jobs of a task whose solutions have the same solution_fingerprint
+        are an equivalence class, only its first job runs and the others copy its result.
+        the per-assert rows of every finished job are written to the sink, or to the run
+        directory which also marks the job as finished. jobs finished before are not run
+        again. options are the keys of DEFAULT_OPTIONS
+    """
+    options = dict(DEFAULT_OPTIONS, **options)
+    threads = threads_per_worker(workers, cores) if cores != 0 else None
+    route_imports = route_imports and executor == 'forkserver'
+    rows = {}
+    jobs = routed_jobs(file_names) if route_imports else iter_jobs(file_names)
+    running = {}
+    pools = {}  # preloaded libraries -> pool, started on first use
+    groups = {}  # running future -> the group of its pool
+    classes = {}  # (task_id, fingerprint) -> the future running the class, then its row and records
+    members = {}  # running future -> its class and the (order, model) of the jobs waiting for its result
+
+    def submit(model, item):
+        group = task_libraries(item) if route_imports else tuple(preload)
+        if group not in pools:
+            # the groups come one after another, retire the pools that have no jobs left
+            for idle in set(pools) - set(groups.values()):
+                pools.pop(idle).shutdown(wait=False)
+            pools[group] = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                               initargs=(executor, list(group), cache_path, cache_size, threads))
+        future = pools[group].submit(run_job, model, item, options)
+        groups[future] = group
+        return future
+
+    def finish(order, row, records):
+        if run is not None:
+            run.finish_job(assert_rows(row['model'], row['task_id'], records, row['fingerprint']), row)
+        elif sink is not None:
+            sink.write_job(assert_rows(row['model'], row['task_id'], records, row['fingerprint']))
+        rows[order] = row
+
+    try:
+        while True:
+            # submit lazily, so only the running jobs are held in memory
+            while len(running) < workers:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                order, model, item = job
+                row = finished_row(model, item['task_id'], sink, run)
+                if row is not None:
+                    rows[order] = row
+                    continue
+                equivalence = (item['task_id'], solution_fingerprint(item['solution'])) if normalize else None
+                if equivalence in classes:
+                    if isinstance(classes[equivalence], tuple):
+                        row, records = classes[equivalence]
+                        finish(order, copied_row(row, model), records)
+                    else:
+                        members[classes[equivalence]][1].append((order, model))
+                    continue
+                future = submit(model, item)
+                running[future] = order
+                members[future] = (equivalence, [])
+                if normalize:
+                    classes[equivalence] = future
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = future.result()
+                records = row.pop('asserts')
+                finish(running.pop(future), row, records)
+                equivalence, waiting = members.pop(future)
+                for order, model in waiting:
+                    finish(order, copied_row(row, model), records)
+                if normalize:
+                    classes[equivalence] = (row, records)
+                groups.pop(future)
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+    return [rows[order] for order in sorted(rows)]
+
+
+def write_table(rows, output):
+    """
+        write the merged result table as csv
+    """
+    fields = ['model', 'task_id', 'assert_num', 'wrong_num', 'verdict', 'duration', 'job_timeout', 'fingerprint']
+    with open(output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_summary(rows):
+    """
+        the pass rate and partial wrong rate of every model
+    """
+    models = {}
+    for row in rows:
+        models.setdefault(row['model'], []).append(row)
+    for model, model_rows in models.items():
+        cnt = len(model_rows)
+        t_pass = sum(row['verdict'] == 'pass' for row in model_rows)
+        t_partial_wrong = sum(row['verdict'] == 'partial_wrong' for row in model_rows)
+        print(f"{model}: {cnt} tasks, pass rate: {t_pass / cnt}, partial wrong rate: {t_partial_wrong / cnt}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="evaluate several LLMs on RWPB in parallel")
+    parser.add_argument('--files', nargs='*', default=['./LLMGeneratedCode/*.json'],
+                        help="json files of LLM's output, glob patterns are expanded")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="size of the process pool, the global cap on concurrently running jobs")
+    parser.add_argument('--cores', type=int, default=available_cores(),
+                        help="core budget split over the workers as the thread count of torch and numpy, "
+                             "0 leaves the thread pools at the library defaults")
+    parser.add_argument('--route-imports', action='store_true',
+                        help="with the fork server, run each task in a pool preloading exactly the libraries it imports")
+    parser.add_argument('--normalize', action='store_true',
+                        help="run the solutions of a task that only differ in comments, docstrings, "
+                             "formatting or local names once and copy the result to the other models")
+    parser.add_argument('--mode', choices=['cumulative', 'incremental', 'batch'], default='cumulative')
+    parser.add_argument('--executor', choices=['subprocess', 'pipe', 'forkserver'], default='subprocess')
+    parser.add_argument('--preload', nargs='*', default=['torch', 'numpy'])
+    parser.add_argument('--timeout', type=float, default=60, help="seconds per execution")
+    parser.add_argument('--max-memory', type=int, default=None, help="address space limit of an execution in MB")
+    parser.add_argument('--max-cpu', type=int, default=None, help="CPU time limit of an execution in seconds")
+    parser.add_argument('--max-open-files', type=int, default=None, help="open file limit of an execution")
+    parser.add_argument('--rtol', type=float, default=None,
+                        help="compare the results of == asserts at this relative tolerance")
+    parser.add_argument('--atol', type=float, default=None,
+                        help="compare the results of == asserts at this absolute tolerance")
+    parser.add_argument('--job-timeout', type=float, default=600, help="seconds per (model, task) job")
+    parser.add_argument('--output', default='results.csv', help="the merged result table")
+    parser.add_argument('--cache', default=None, help="sqlite file caching the results of unchanged executions")
+    parser.add_argument('--cache-size', type=int, default=200000, help="maximum number of cached results")
+    parser.add_argument('--adaptive-timeout', action='store_true',
+                        help="derive the timeout of each task from the runtime of its canonical solution")
+    parser.add_argument('--timeout-multiplier', type=float, default=10)
+    parser.add_argument('--timeout-floor', type=float, default=5, help="the shortest adaptive timeout in seconds")
+    parser.add_argument('--results', default=None,
+                        help="jsonl file (or .parquet directory) receiving one row per assert, "
+                             "jobs already completed in it are not executed again")
+    parser.add_argument('--run-dir', default=None,
+                        help="directory holding the manifest, the per-assert results and the job completion markers")
+    parser.add_argument('--resume', action='store_true', help="continue the run in --run-dir, skipping finished jobs")
+    parser.add_argument('--profile', action='store_true',
+                        help="time the startup, import, definition, setup and assert phases of every execution "
+                             "and print where the time went")
+    args = parser.parse_args()
+    if args.run_dir and args.results:
+        parser.error("--run-dir keeps the per-assert results in the run directory, it cannot be combined with --results")
+
+    file_names = []
+    for pattern in args.files:
+        file_names.extend(sorted(glob.glob(pattern)))
+
+    options = {'mode': args.mode, 'timeout': args.timeout, 'job_timeout': args.job_timeout,
+               'adaptive_timeout': args.adaptive_timeout, 'timeout_multiplier': args.timeout_multiplier,
+               'timeout_floor': args.timeout_floor}
+    if args.profile:
+        options['profile'] = True
+    limits = resource_limits(args.max_memory, args.max_cpu, args.max_open_files)
+    if limits:
+        options['limits'] = limits
+    tolerance = tolerances(args.rtol, args.atol)
+    if tolerance:
+        options['tolerance'] = tolerance
+    run = None
+    sink = None
+    if args.run_dir:
+        config = dict(options, files=[os.path.abspath(file_name) for file_name in file_names])
+        config.pop('profile', None)  # does not change the verdicts, a profiled run can resume an unprofiled one
+        run = RunDirectory(args.run_dir, config, resume=args.resume)
+    elif args.results:
+        sink = open_sink(args.results)
+    try:
+        rows = schedule(file_names, args.workers, args.executor, args.preload, args.cache, args.cache_size,
+                        sink, run, args.cores, args.route_imports, args.normalize, **options)
+    finally:
+        if sink is not None:
+            sink.close()
+        if run is not None:
+            run.close()
+    write_table(rows, args.output)
+    print_summary(rows)
+    if args.profile:
+        print()
+        print_phases(rows)
+
+
+if __name__ == '__main__':
+    main()
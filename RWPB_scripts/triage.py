@@ -0,0 +1,204 @@
+# automatic bug types of the failed asserts, classified from the captured stderr without running anything.
+# the labels have the "Category: Type" form of the manually labeled bug_type field read by Scripts/analysis.py
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+
+from environment import DISTRIBUTIONS
+from evaluate import model_name
+from loader import iter_records, write_records
+
+FRAME = re.compile(r'^\s*File "([^"]+)", line (\d+)', re.MULTILINE)
+EXCEPTION = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))\b:? ?(.*)$", re.MULTILINE)
+MISSING_MODULE = re.compile(r"No module named '([\w.]+)'")
+IMPORT_NAME = re.compile(r"cannot import name '(\w+)' from '([\w.]+)'")
+MISSING_ATTRIBUTE = re.compile(r"module '([\w.]+)' has no attribute '(\w+)'")
+CALL_SIGNATURE = re.compile(r"positional argument|keyword argument|takes \d+ positional|missing \d+ required")
+
+# torch and numpy messages of operands with shapes that do not fit together
+SHAPE_MISMATCH = re.compile(
+    r"size of tensor a \(\d+\) must match|shapes cannot be multiplied|mat1 and mat2|Sizes of tensors must match"
+    r"|shape '\[[^\]]*\]' is invalid for input of size|could not be broadcast|could not broadcast"
+    r"|cannot reshape array of size|not aligned|mismatch in its core dimension|dimensions? .* must match"
+    r"|Dimension out of range|too many indices for (?:tensor|array)|Expected \d+D|expected \d+D"
+    r"|number of dims|inconsistent (?:tensor )?(?:size|shape)|doesn't match the broadcast shape"
+    r"|must match the size|must match the existing size|The expanded size")
+DTYPE_MISMATCH = re.compile(
+    r"expected scalar type|dtype|not implemented for '\w+'|result type \w+ can't be cast|Cannot cast"
+    r"|UFuncTypeError|Found dtype|expected both .* to have the same dtype")
+DEVICE_MISMATCH = re.compile(r"same device|Expected all tensors to be on")
+NO_GPU = re.compile(r"not compiled with CUDA|No CUDA GPUs|CUDA driver|CUDA_VISIBLE_DEVICES|cuda runtime error")
+
+TEMP = tempfile.gettempdir()  # run_code writes the script to a temporary file
+
+
+def script_regions(item):
+    """
+        the last line of the solution and of the canonical solution in the test script of the task,
+        the lines after them are the unit tests, see build_test_script
+    """
+    solution = item['solution'].count('\n') + 1
+    canonical = (item['prompt'] + item['canonical_solution']).count('\n') + 1
+    return solution, solution + canonical
+
+
+def frame_origin(path, line, regions=None):
+    """
+        where a traceback frame runs: the solution, the canonical solution or the tests of the script,
+        'script' when the regions are unknown, and 'library' for installed and standard library code
+    """
+    if path == '<sandbox>' or (path.startswith(TEMP) and not path.endswith('.py')):
+        if regions is None:
+            return 'script'
+        if line <= regions[0]:
+            return 'solution'
+        return 'canonical' if line <= regions[1] else 'test'
+    if path.endswith('sandbox.py'):  # the frames of the executor running the script
+        return None
+    return 'library'
+
+
+def triage(errors, regions=None):
+    """
+        the bug type of a failed assert from its stderr, with the exception, the origin of the innermost
+        frame, the caller of the library in the script and the module of an import error
+    """
+    result = {'bug_type': '', 'exception': '', 'origin': None, 'caller': None, 'module': None, 'message': ''}
+    if not errors.strip():
+        return result
+    if errors == "timeout error":
+        result.update(bug_type="Runtime Error: Timeout", exception='timeout')
+        return result
+    if errors == "function_error":  # run_code keeps only that an AssertionError was raised
+        result.update(bug_type="Functional Bug: Wrong Output", exception='AssertionError', origin='test')
+        return result
+
+    for path, line in FRAME.findall(errors):
+        origin = frame_origin(path, int(line), regions)
+        if origin == 'library':
+            result['origin'] = 'library'
+        elif origin is not None:
+            result['origin'] = result['caller'] = origin
+    exceptions = EXCEPTION.findall(errors)
+    if not exceptions:
+        if 'killed by SIG' in errors:
+            result.update(bug_type="Runtime Error: Resource Limit", exception='signal')
+        else:  # a warning or other output on stderr, which fails the assert as well
+            result.update(bug_type="Runtime Error: Stderr Output", message=errors.strip().split('\n')[-1][:200])
+        return result
+    name, message = exceptions[-1]
+    name = name.split('.')[-1]
+    result.update(exception=name, message=message[:200])
+    result['bug_type'] = bug_type(name, message, result)
+    return result
+
+
+def bug_type(name, message, result):
+    """
+        the label of an exception, the module of an import or attribute error is set on the result
+    """
+    if name in ('SyntaxError', 'IndentationError', 'TabError'):
+        return "Syntax Error: Indentation" if name != 'SyntaxError' else "Syntax Error: Invalid Syntax"
+    if name in ('ModuleNotFoundError', 'ImportError'):
+        match = MISSING_MODULE.search(message) or IMPORT_NAME.search(message)
+        if match:
+            result['module'] = match.group(match.lastindex).split('.')[0]
+        if name == 'ModuleNotFoundError' and result['module'] in DISTRIBUTIONS:
+            return "Environment Error: Missing Library"  # a library of the benchmark that is not installed
+        return "Runtime Error: Import Error"
+    if NO_GPU.search(message):
+        return "Environment Error: No GPU"
+    if name == 'AssertionError':
+        return "Functional Bug: Wrong Output" if result['caller'] in ('test', None) else "Runtime Error: Assertion"
+    if name in ('MemoryError', 'RecursionError'):
+        return "Runtime Error: Resource Limit"
+    if SHAPE_MISMATCH.search(message):
+        return "Runtime Error: Shape Mismatch"
+    if DEVICE_MISMATCH.search(message):
+        return "Runtime Error: Device Mismatch"
+    if DTYPE_MISMATCH.search(message):
+        return "Runtime Error: Dtype Mismatch"
+    if name == 'NameError':
+        return "Runtime Error: Missing Function" if result['caller'] == 'test' else "Runtime Error: Undefined Name"
+    match = MISSING_ATTRIBUTE.search(message)
+    if match:  # a function the library does not have
+        result['module'] = match.group(1).split('.')[0]
+        return "Runtime Error: API Misuse"
+    if name == 'TypeError' and CALL_SIGNATURE.search(message):
+        return "Runtime Error: Signature Mismatch"
+    if result['origin'] == 'library':
+        return "Runtime Error: API Misuse"
+    return f"Runtime Error: {re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', name)}"
+
+
+def labeled_records(file_name, labels):
+    """
+        the tasks of a model file with the bug type of their first failed assert, the later ones
+        mostly repeat its error. tasks without a failure get an empty bug type
+    """
+    model = model_name(file_name)
+    for item in iter_records(file_name):
+        results = labels.get((model, item['task_id']))
+        yield dict(item, bug_type=results[0]['bug_type'] if results else "", triage=results[0] if results else None)
+
+
+def read_rows(path):
+    """
+        the per-assert rows of a results file, a parquet directory or a run directory
+    """
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, 'results.jsonl')):
+        path = os.path.join(path, 'results.jsonl')
+    if os.path.isdir(path):
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path).to_pylist()
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.endswith('\n'):  # a line cut off by a crash is left out
+                rows.append(json.loads(line))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="label the failed asserts of a sweep with their bug type")
+    parser.add_argument('--results', required=True,
+                        help="per-assert results written with --results, a .parquet directory or a --run-dir")
+    parser.add_argument('--files', nargs='*', default=[],
+                        help="json files of LLM's output, to tell the solution from the tests in the tracebacks")
+    parser.add_argument('--output', default=None,
+                        help="directory receiving the files with a bug_type per task, for Scripts/analysis.py")
+    args = parser.parse_args()
+
+    rows = read_rows(args.results)
+    items = {}
+    for file_name in args.files:
+        items[model_name(file_name)] = {item['task_id']: item for item in iter_records(file_name)}
+
+    start = time.perf_counter()
+    labels = {}  # (model, task_id) -> the triage of each failed assert
+    for row in rows:
+        if row['verdict'] not in ('fail', 'timeout'):
+            continue
+        item = items.get(row['model'], {}).get(row['task_id'])
+        result = triage(row['stderr'] if row['verdict'] == 'fail' else "timeout error",
+                        script_regions(item) if item else None)
+        labels.setdefault((row['model'], row['task_id']), []).append(result)
+    elapsed = time.perf_counter() - start
+    print(f"{sum(map(len, labels.values()))} failed asserts classified in {elapsed * 1e3:.1f} ms")
+
+    for model in dict.fromkeys(row['model'] for row in rows):
+        counts = Counter(results[0]['bug_type'] for (name, _), results in labels.items() if name == model)
+        print(f"{model}: " + ', '.join(f"{label} {count}" for label, count in counts.most_common()))
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for file_name in args.files:
+            write_records(os.path.join(args.output, os.path.basename(file_name)), labeled_records(file_name, labels))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
-import jsonlines
+import os
+import sys
 import numpy as np
 from radon.complexity import cc_visit
 import ast
@@ -9,6 +10,9 @@ import seaborn as sns
 import pandas as pd
 from scipy.interpolate import make_interp_spline
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RWPB_scripts'))
+from loader import open_records  # streams .json arrays and .jsonl files one record at a time
+
 
 def count_lines_of_code(code):
     lines = code.split('\n')
@@ -54,7 +58,7 @@ def get_canonical_solution_distribution(file):  # get the code feature distribut
     cc_of_code = []
     api_in_code = []
     token_in_description = []
-    with jsonlines.open(file, "r") as reader:
+    with open_records(file) as reader:
         for obj in reader:
             description = obj["prompt"]
             if "humaneval" in file:
@@ -70,7 +74,7 @@ def get_canonical_solution_distribution(file):  # get the code feature distribut
 
 def get_code_feature_difference(
         file):  # get the difference of the code features between the correct code and the canonical solution
-    with jsonlines.open(file, "r") as reader:
+    with open_records(file) as reader:
         line_of_code = []
         cc_of_code = []
         api_in_code = []
@@ -208,7 +212,7 @@ def comment_distribution(humaneval, mbpp, apps, rwpb):  # count the number of co
     humaneval_correct_comment = []
     humaneval_wrong_comment = []
     for file in humaneval:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             correct_comment = []
             wrong_comment = []
             for obj in reader:
@@ -223,7 +227,7 @@ def comment_distribution(humaneval, mbpp, apps, rwpb):  # count the number of co
     mbpp_correct_comment = []
     mbpp_wrong_comment = []
     for file in mbpp:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             correct_comment = []
             wrong_comment = []
             for obj in reader:
@@ -238,7 +242,7 @@ def comment_distribution(humaneval, mbpp, apps, rwpb):  # count the number of co
     apps_correct_comment = []
     apps_wrong_comment = []
     for file in apps:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             correct_comment = []
             wrong_comment = []
             for obj in reader:
@@ -253,7 +257,7 @@ def comment_distribution(humaneval, mbpp, apps, rwpb):  # count the number of co
     rwpb_correct_comment = []
     rwpb_wrong_comment = []
     for file in rwpb:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             correct_comment = []
             wrong_comment = []
             for obj in reader:
@@ -322,25 +326,25 @@ def significant_test(correct_comment, wrong_comment):
 def get_bug_type_distribution(humaneval, mbpp, apps, rwpb, bug_type):  # get the distribution of bug type. Figure 4.
     humaneval_bug = []
     for file in humaneval:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             for obj in reader:
                 if obj["bug_type"].startswith(bug_type):
                     humaneval_bug.append(obj)
     mbpp_bug = []
     for file in mbpp:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             for obj in reader:
                 if obj["bug_type"].startswith(bug_type):
                     mbpp_bug.append(obj)
     apps_bug = []
     for file in apps:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             for obj in reader:
                 if obj["bug_type"].startswith(bug_type):
                     apps_bug.append(obj)
     rwpb_bug = []
     for file in rwpb:
-        with jsonlines.open(file, "r") as reader:
+        with open_records(file) as reader:
             for obj in reader:
                 if obj["bug_type"].startswith(bug_type):
                     rwpb_bug.append(obj)